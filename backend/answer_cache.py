@@ -0,0 +1,61 @@
+import hashlib
+import threading
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from cachetools import LRUCache
+
+class AnswerCache:
+    """LRU cache of answers, matched exactly on the question text or semantically on its embedding"""
+
+    def __init__(self, maxsize: int = 1024, similarity_threshold: float = 0.97):
+        self.answers = LRUCache(maxsize=maxsize)  # (question hash, top_k) -> answer
+        self.embeddings = {}  # (question hash, top_k) -> normalized question embedding
+        self.similarity_threshold = similarity_threshold
+        self.version = None  # Embedding store version the cached answers were produced from
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(question: str, top_k: int) -> Tuple[str, int]:
+        """Key an answer by a hash of the normalized question and the retrieval depth"""
+        normalized = " ".join(question.lower().split())
+        return hashlib.sha256(normalized.encode()).hexdigest(), top_k
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32)
+        return embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+
+    def get(self, key: Tuple[str, int], embedding: Optional[np.ndarray] = None) -> Optional[Dict[str, Any]]:
+        """Get a cached answer for the exact question or, failing that, the most similar cached question"""
+        with self.lock:
+            if key in self.answers:
+                return self.answers[key]
+            if embedding is None:
+                return None
+
+            # Nearest cached question asked with the same top_k
+            candidates = [k for k in self.answers.keys() if k[1] == key[1]]
+            if not candidates:
+                return None
+            similarities = np.stack([self.embeddings[k] for k in candidates]) @ self._normalize(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.similarity_threshold:
+                return self.answers[candidates[best]]
+            return None
+
+    def put(self, key: Tuple[str, int], embedding: np.ndarray, answer: Dict[str, Any]) -> None:
+        """Cache an answer"""
+        with self.lock:
+            self.answers[key] = answer
+            self.embeddings[key] = self._normalize(embedding)
+            # Forget the embeddings of answers the LRU has evicted
+            if len(self.embeddings) > len(self.answers):
+                self.embeddings = {k: self.embeddings[k] for k in self.answers.keys()}
+
+    def invalidate_if_stale(self, version: int) -> None:
+        """Drop every cached answer once the documents they were based on have changed"""
+        with self.lock:
+            if self.version != version:
+                self.answers.clear()
+                self.embeddings = {}
+                self.version = version
@@ -0,0 +1,267 @@
+import math
+import heapq
+import bisect
+import threading
+from collections import Counter, defaultdict
+from typing import List, Dict, Tuple
+import numpy as np
+
+class BM25Index:
+    """BM25 index updated incrementally: adds and deletes only touch the affected documents.
+
+    Searches may run in several threads while another thread updates the index: updates,
+    the lazy recomputation of the length normalization and reads of the per-row data
+    all happen under one lock.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+        self.df = Counter()  # Number of documents containing each term
+        self.doc_lens = []  # Token count of each document (row)
+        self.tf_rows = []  # Term counts of each document (row)
+        self.total_len = 0
+        self.postings = defaultdict(list)  # Rows containing each term, in ascending order
+
+        # Length normalization and per-term caches, recomputed lazily after updates
+        self._bm25_dirty = True
+        self._norms = np.zeros(0)
+        self._posting_arrays = {}  # term -> (rows, term frequencies) as arrays
+        self._upper_bounds = {}  # term -> highest score the term gives any document
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.tf_rows)
+
+    def add(self, tokenized_docs: List[List[str]]) -> None:
+        """Append documents as new rows at the end of the index"""
+        docs = [(Counter(tokens), len(tokens)) for tokens in tokenized_docs]
+        with self._lock:
+            for tf, doc_len in docs:
+                self.df.update(tf.keys())
+                for term in tf:
+                    self.postings[term].append(len(self.tf_rows))
+                self.tf_rows.append(tf)
+                self.doc_lens.append(doc_len)
+                self.total_len += doc_len
+            self._bm25_dirty = True
+
+    def remove(self, rows: List[int]) -> None:
+        """Remove the given rows; the remaining rows keep their relative order"""
+        removed = set(rows)
+        if not removed:
+            return
+
+        with self._lock:
+            affected_terms = set()
+            for row in removed:
+                tf = self.tf_rows[row]
+                self.df.subtract(tf.keys())
+                affected_terms.update(tf.keys())
+                self.total_len -= self.doc_lens[row]
+            # Drop terms that no longer occur in any document
+            self.df = +self.df
+
+            # New row number of every kept row
+            keep = np.ones(len(self.tf_rows), dtype=bool)
+            keep[list(removed)] = False
+            remap = np.cumsum(keep) - 1
+            self._remap_postings(min(removed), keep, remap, affected_terms)
+
+            self.tf_rows = [tf for row, tf in enumerate(self.tf_rows) if keep[row]]
+            self.doc_lens = [dl for row, dl in enumerate(self.doc_lens) if keep[row]]
+            self._bm25_dirty = True
+
+    def _remap_postings(self, first_removed: int, keep: np.ndarray, remap: np.ndarray, affected_terms: set) -> None:
+        """Renumber the posting lists after a removal.
+
+        Rows before the first removed row keep their number, so only the tail of each
+        list is touched, and removed rows are only filtered out of the affected terms.
+        """
+        emptied = []
+        for term, rows in self.postings.items():
+            start = bisect.bisect_left(rows, first_removed)
+            if start == len(rows):
+                continue
+            tail = np.array(rows[start:], dtype=np.int64)
+            if term in affected_terms:
+                tail = tail[keep[tail]]
+            rows[start:] = remap[tail].tolist()
+            if not rows:
+                emptied.append(term)
+        for term in emptied:
+            del self.postings[term]
+
+    def _rebuild_postings(self) -> None:
+        """Rebuild the posting lists from the per-row term counts (rows are renumbered)"""
+        self.postings = defaultdict(list)
+        for row, tf in enumerate(self.tf_rows):
+            for term in tf:
+                self.postings[term].append(row)
+
+    def idf(self, term: str) -> float:
+        """Lucene-style IDF of a term (0 for unknown terms)"""
+        df = self.df.get(term, 0)
+        if df == 0:
+            return 0.0
+        return math.log(1 + (len(self.tf_rows) - df + 0.5) / (df + 0.5))
+
+    def _refresh(self) -> None:
+        """Recompute per-document length normalization after updates (call with the lock held)"""
+        if not self._bm25_dirty:
+            return
+        doc_lens = np.array(self.doc_lens, dtype=np.float64)
+        avgdl = self.total_len / len(doc_lens) if len(doc_lens) else 0.0
+        if avgdl > 0:
+            self._norms = self.k1 * (1 - self.b + self.b * doc_lens / avgdl)
+        else:
+            self._norms = np.full(len(doc_lens), self.k1)
+        self._posting_arrays = {}
+        self._upper_bounds = {}
+        self._bm25_dirty = False
+
+    def _get_posting_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the rows containing a term and its frequency in each of them"""
+        if term not in self._posting_arrays:
+            rows = np.array(self.postings.get(term, []), dtype=np.int64)
+            tfs = np.fromiter((self.tf_rows[row][term] for row in rows), dtype=np.float64, count=len(rows))
+            self._posting_arrays[term] = (rows, tfs)
+        return self._posting_arrays[term]
+
+    def _term_contributions(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the rows containing a term and the score the term adds to each of them"""
+        rows, tfs = self._get_posting_arrays(term)
+        contributions = self.idf(term) * tfs * (self.k1 + 1) / (tfs + self._norms[rows])
+        if term not in self._upper_bounds:
+            self._upper_bounds[term] = float(contributions.max()) if len(contributions) else 0.0
+        return rows, contributions
+
+    def top_k(self, query_tokens: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-k rows and scores for a query using WAND pruning.
+
+        Posting lists are walked in row order; a row is only scored when the
+        upper bounds of the terms reaching it can beat the current k-th best score.
+        """
+        # Snapshot the per-term arrays; the walk below only reads these
+        with self._lock:
+            self._refresh()
+            cursors = []  # [position, rows, contributions, upper bound] per query term
+            for term in set(query_tokens):
+                if self.df.get(term, 0) > 0 and self.idf(term) > 0:
+                    rows, contributions = self._term_contributions(term)
+                    cursors.append([0, rows, contributions, self._upper_bounds[term]])
+
+        heap = []  # Min-heap of (score, -row) holding the best k rows so far
+        while k > 0:
+            cursors = [c for c in cursors if c[0] < len(c[1])]
+            if not cursors:
+                break
+            cursors.sort(key=lambda c: c[1][c[0]])
+            threshold = heap[0][0] if len(heap) == k else -1.0
+
+            # Pivot: first cursor at which the summed upper bounds can beat the threshold
+            bound = 0.0
+            pivot = None
+            for i, cursor in enumerate(cursors):
+                bound += cursor[3]
+                if bound > threshold:
+                    pivot = i
+                    break
+            if pivot is None:
+                break
+            pivot_row = cursors[pivot][1][cursors[pivot][0]]
+
+            if cursors[0][1][cursors[0][0]] == pivot_row:
+                # Every term up to the pivot is on the pivot row: score it fully
+                score = 0.0
+                for cursor in cursors:
+                    position, rows, contributions, _ = cursor
+                    if rows[position] == pivot_row:
+                        score += contributions[position]
+                        cursor[0] += 1
+                if len(heap) < k:
+                    heapq.heappush(heap, (score, -int(pivot_row)))
+                elif score > threshold:
+                    heapq.heapreplace(heap, (score, -int(pivot_row)))
+            else:
+                # Rows before the pivot cannot enter the top k: skip ahead
+                for cursor in cursors[:pivot]:
+                    cursor[0] = int(np.searchsorted(cursor[1], pivot_row, side="left"))
+
+        best = sorted(heap, reverse=True)
+        rows = np.array([-row for _, row in best], dtype=np.int64)
+        scores = np.array([score for score, _ in best], dtype=np.float64)
+        return rows, scores
+
+    def scores_for(self, rows: np.ndarray, query_tokens: List[str]) -> np.ndarray:
+        """Get the BM25 scores of only the given rows for a tokenized query (0 for rows no longer in the index)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        scores = np.zeros(len(rows))
+        with self._lock:
+            self._refresh()
+            valid = (rows >= 0) & (rows < len(self.tf_rows))
+            rows = rows[valid]
+            valid_scores = np.zeros(len(rows))
+            for term in set(query_tokens):
+                idf = self.idf(term)
+                if idf == 0:
+                    continue
+                tf = np.fromiter((self.tf_rows[row].get(term, 0) for row in rows), dtype=np.float64, count=len(rows))
+                valid_scores += idf * tf * (self.k1 + 1) / (tf + self._norms[rows])
+        scores[valid] = valid_scores
+        return scores
+
+    def get_scores(self, query_tokens: List[str]) -> np.ndarray:
+        """Get the BM25 score of every document for a tokenized query"""
+        with self._lock:
+            self._refresh()
+            scores = np.zeros(len(self.tf_rows))
+            for term in set(query_tokens):
+                idf = self.idf(term)
+                if idf == 0:
+                    continue
+                tf = np.fromiter((row.get(term, 0) for row in self.tf_rows), dtype=np.float64, count=len(self.tf_rows))
+                scores += idf * tf * (self.k1 + 1) / (tf + self._norms)
+        return scores
+
+    def get_arrays(self) -> Dict[str, np.ndarray]:
+        """Get the index as compressed-sparse-row arrays (one row per document) for persistence"""
+        with self._lock:
+            vocab = sorted(self.df)
+            term_ids = {term: i for i, term in enumerate(vocab)}
+            indptr = np.zeros(len(self.tf_rows) + 1, dtype=np.int64)
+            indices = []
+            data = []
+            for row, tf in enumerate(self.tf_rows):
+                indices.extend(term_ids[term] for term in tf)
+                data.extend(tf.values())
+                indptr[row + 1] = len(indices)
+
+            return {
+                "params": np.array([self.k1, self.b]),
+                "vocab": np.array(vocab, dtype=np.str_),
+                "indptr": indptr,
+                "indices": np.array(indices, dtype=np.int64),
+                "data": np.array(data, dtype=np.int64),
+                "doc_lens": np.array(self.doc_lens, dtype=np.int64)
+            }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "BM25Index":
+        """Recreate an index from the arrays returned by get_arrays"""
+        k1, b = arrays["params"].tolist()
+        index = cls(k1=k1, b=b)
+        vocab = arrays["vocab"].tolist()
+        indptr = arrays["indptr"].tolist()
+        indices = arrays["indices"].tolist()
+        data = arrays["data"].tolist()
+        for row in range(len(indptr) - 1):
+            start, end = indptr[row], indptr[row + 1]
+            index.tf_rows.append(Counter({vocab[i]: tf for i, tf in zip(indices[start:end], data[start:end])}))
+        index.doc_lens = arrays["doc_lens"].tolist()
+        index.total_len = sum(index.doc_lens)
+        for tf in index.tf_rows:
+            index.df.update(tf.keys())
+        index._rebuild_postings()
+        return index
@@ -1,9 +1,14 @@
 import os
+import functools
 from pathlib import Path
+from typing import Dict, Final
 from dotenv import load_dotenv
 
-# Load environment variables from .env file if it exists
-load_dotenv()
+@functools.lru_cache(maxsize=1)
+def _env() -> Dict[str, str]:
+    """Load the .env file (if it exists) once and snapshot the resulting environment"""
+    load_dotenv(override=False)
+    return os.environ.copy()
 
 # Base directories
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -15,38 +20,60 @@ os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(MODELS_DIR, exist_ok=True)
 
 # PDF Processing
-CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
-CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
-MAX_DOCS_TO_RETRIEVE = int(os.getenv("MAX_DOCS_TO_RETRIEVE", "5"))
+CHUNK_SIZE = int(_env().get("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(_env().get("CHUNK_OVERLAP", "200"))
+MAX_DOCS_TO_RETRIEVE = int(_env().get("MAX_DOCS_TO_RETRIEVE", "5"))
+PDF_WORKERS = int(_env().get("PDF_WORKERS", str(min(os.cpu_count() or 1, 4))))  # Processes used to parse PDFs in parallel
 
 # Vector DB settings
-VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", os.path.join(MODELS_DIR, "chroma_db"))
-EMBEDDINGS_MODEL = os.getenv("EMBEDDINGS_MODEL", "all-MiniLM-L6-v2")  # Default local model from sentence-transformers
+CHROMA_MODE = _env().get("CHROMA_MODE", "embedded")  # "embedded" (in-process) or "http" (separate Chroma server)
+CHROMA_HOST = _env().get("CHROMA_HOST", "localhost")
+CHROMA_PORT = int(_env().get("CHROMA_PORT", "8000"))
+VECTOR_DB_PATH = _env().get("VECTOR_DB_PATH", os.path.join(MODELS_DIR, "chroma_db"))
+CHROMA_SHARDS = int(_env().get("CHROMA_SHARDS", "1"))  # Collections chunks are spread over by filename (1 = single "pdf_chunks" collection; changing it needs a re-index)
+CHROMA_BATCH_SIZE = int(_env().get("CHROMA_BATCH_SIZE", "5000"))  # Chunks per collection.add call
+EMBEDDINGS_MODEL = _env().get("EMBEDDINGS_MODEL", "all-MiniLM-L6-v2")  # Default local model from sentence-transformers
+EMBEDDING_BATCH_SIZE = int(_env().get("EMBEDDING_BATCH_SIZE", "64"))  # Texts per forward pass when embedding chunks
+EMBEDDINGS_BACKEND = _env().get("EMBEDDINGS_BACKEND", "sentence-transformers")  # "sentence-transformers", "onnx-int8" or "ollama"
+QUERY_EMBEDDING_CACHE_SIZE = int(_env().get("QUERY_EMBEDDING_CACHE_SIZE", "2048"))  # Query embeddings kept in the LRU cache
+ONNX_MODEL_PATH = _env().get("ONNX_MODEL_PATH", os.path.join(MODELS_DIR, "onnx-int8"))  # Quantized export used by the onnx-int8 backend
+EMBEDDING_CACHE_PATH = _env().get("EMBEDDING_CACHE_PATH", os.path.join(MODELS_DIR, "embedding_cache.sqlite"))  # Chunk embeddings reused on re-ingestion
+OLLAMA_EMBEDDING_MODEL = _env().get("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")  # Embedding model served by Ollama for the ollama backend
 
 # LLM settings
-DEFAULT_LLM_MODEL = os.getenv("DEFAULT_LLM_MODEL", "mistral")  # Default Ollama model
-USE_LOCAL_LLM = os.getenv("USE_LOCAL_LLM", "true").lower() == "true"  # Set to False to use OpenAI API
+DEFAULT_LLM_MODEL = _env().get("DEFAULT_LLM_MODEL", "mistral")  # Default Ollama model
+USE_LOCAL_LLM = _env().get("USE_LOCAL_LLM", "true").lower() == "true"  # Set to False to use OpenAI API
+SUMMARY_GROUP_SIZE = int(_env().get("SUMMARY_GROUP_SIZE", "8"))  # Chunks per section in map-reduce summarization
+SUMMARY_CONCURRENCY = int(_env().get("SUMMARY_CONCURRENCY", "4"))  # Section summaries requested at once (match OLLAMA_NUM_PARALLEL)
 
 # API keys (load from environment variables)
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_API_KEY = _env().get("OPENAI_API_KEY", "")
 
 # FastAPI settings
-API_HOST = os.getenv("API_HOST", "0.0.0.0")
-API_PORT = int(os.getenv("API_PORT", "8002"))
+API_HOST = _env().get("API_HOST", "0.0.0.0")
+API_PORT: Final = int(_env().get("API_PORT", "8002"))
+
+# Seconds without further changes before the BM25 state is written to disk
+SAVE_STATE_DELAY = float(_env().get("SAVE_STATE_DELAY", "2.0"))
 
 # Streamlit settings
-STREAMLIT_PORT = int(os.getenv("STREAMLIT_PORT", "8501"))
+STREAMLIT_PORT = int(_env().get("STREAMLIT_PORT", "8501"))
 
 # BM25 settings
-USE_HYBRID_SEARCH = os.getenv("USE_HYBRID_SEARCH", "true").lower() == "true"  # Combine vector search with BM25
-BM25_WEIGHT = float(os.getenv("BM25_WEIGHT", "0.3"))  # Weight for BM25 scores in hybrid search (0-1)
-VECTOR_WEIGHT = float(os.getenv("VECTOR_WEIGHT", "0.7"))  # Weight for vector scores in hybrid search (0-1)
+USE_HYBRID_SEARCH = _env().get("USE_HYBRID_SEARCH", "true").lower() == "true"  # Combine vector search with BM25
+BM25_WEIGHT = float(_env().get("BM25_WEIGHT", "0.3"))  # Weight for BM25 scores in hybrid search (0-1)
+VECTOR_WEIGHT = float(_env().get("VECTOR_WEIGHT", "0.7"))  # Weight for vector scores in hybrid search (0-1)
 
 # Citation settings
-SHOW_CITATIONS = os.getenv("SHOW_CITATIONS", "true").lower() == "true"
-MAX_CITATIONS = int(os.getenv("MAX_CITATIONS", "3"))
+SHOW_CITATIONS = _env().get("SHOW_CITATIONS", "true").lower() == "true"
+
+# Answer cache settings
+ANSWER_CACHE_SIZE = int(_env().get("ANSWER_CACHE_SIZE", "1024"))  # Answers kept in the LRU cache (0 disables caching)
+ANSWER_CACHE_SIMILARITY = float(_env().get("ANSWER_CACHE_SIMILARITY", "0.97"))  # Cosine similarity for reusing the answer to a near-identical question
+MAX_CITATIONS = int(_env().get("MAX_CITATIONS", "3"))
 
 # Ollama settings (for Docker)
-OLLAMA_HOST = os.getenv("OLLAMA_HOST", "localhost")
-OLLAMA_PORT = int(os.getenv("OLLAMA_PORT", "11434"))
-OLLAMA_URL = f"http://{OLLAMA_HOST}:{OLLAMA_PORT}" 
\ No newline at end of file
+OLLAMA_HOST = _env().get("OLLAMA_HOST", "localhost")
+OLLAMA_PORT = int(_env().get("OLLAMA_PORT", "11434"))
+OLLAMA_URL: Final = f"http://{OLLAMA_HOST}:{OLLAMA_PORT}" 
+OLLAMA_KEEP_ALIVE = _env().get("OLLAMA_KEEP_ALIVE", "1h")  # How long Ollama keeps the model loaded after the startup preload
@@ -1,4 +1,13 @@
 import os
+import re
+import shutil
+import json
+import zlib
+import hashlib
+import functools
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import pickle
 from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
@@ -9,16 +18,93 @@ try:
 except ImportError:
     print("Warning: sentence_transformers not available. Using numpy random embeddings as fallback.")
     SENTENCE_TRANSFORMERS_AVAILABLE = False
+import pyarrow as pa
+from pyarrow import ipc
 import chromadb
 from chromadb.config import Settings
-from rank_bm25 import BM25Okapi
+try:
+    import Stemmer
+    BM25_STEMMER = Stemmer.Stemmer("english")
+except ImportError:
+    print("Warning: PyStemmer not available. BM25 tokens will not be stemmed.")
+    BM25_STEMMER = None
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 import config
+from bm25_index import BM25Index
+from embedders import OnnxEmbedder, OllamaEmbedder
+from embedding_cache import EmbeddingCache
+
+# BM25 tokenization: runs of letters/digits, minus the Lucene English stopwords
+_TOKEN_RE = re.compile(r"[^\W_]+")
+BM25_STOPWORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "if", "in", "into", "is", "it",
+    "no", "not", "of", "on", "or", "such", "that", "the", "their", "then", "there", "these",
+    "they", "this", "to", "was", "will", "with"
+))
+
+# Persisted state: chunks as an Arrow IPC file, the BM25 index as CSR arrays
+STATE_PATH = os.path.join(config.MODELS_DIR, "state.arrow")
+BM25_STATE_PATH = os.path.join(config.MODELS_DIR, "bm25.npz")
+
+# Index directory of the short-lived bm25s-based BM25 leg, since replaced by BM25Index.
+# load_legacy_state still takes the chunks from its pickle (bm25_state.pkl) and re-indexes
+# them; the directory is never read and is removed once the state is saved in the current format.
+LEGACY_BM25S_INDEX_DIR = os.path.join(config.MODELS_DIR, "bm25_index")
+
+def _combine_scores(vector_scores: np.ndarray, bm25_scores: np.ndarray, bm25_max: float,
+                    vector_weight: float, bm25_weight: float, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Fuse vector and max-normalized BM25 scores in one pass, keeping the top_k in descending order"""
+    k = min(top_k, vector_scores.shape[0])
+    top_idx = np.empty(k, dtype=np.int64)
+    top_val = np.empty(k, dtype=np.float64)
+    size = 0
+    scale = 1.0 / bm25_max if bm25_max > 0 else 1.0
+    
+    for i in range(vector_scores.shape[0]):
+        score = vector_weight * vector_scores[i] + bm25_weight * bm25_scores[i] * scale
+        if size < k:
+            j = size
+            size += 1
+        elif score > top_val[k - 1]:
+            j = k - 1
+        else:
+            continue
+        
+        # Insertion step; earlier candidates win ties
+        while j > 0 and top_val[j - 1] < score:
+            top_val[j] = top_val[j - 1]
+            top_idx[j] = top_idx[j - 1]
+            j -= 1
+        top_val[j] = score
+        top_idx[j] = i
+    
+    return top_idx, top_val
+
+# JIT-compile the fusion kernel when numba is installed
+combine_scores = numba.njit(cache=True, fastmath=True)(_combine_scores) if NUMBA_AVAILABLE else _combine_scores
 
 class EmbeddingStore:
     def __init__(self):
         # Initialize the embedding model
-        if SENTENCE_TRANSFORMERS_AVAILABLE:
+        if config.EMBEDDINGS_BACKEND == "onnx-int8":
             try:
+                self.embedding_model = OnnxEmbedder(config.ONNX_MODEL_PATH)
+            except Exception as e:
+                print(f"Error loading ONNX embedding model: {str(e)}")
+                print("Using numpy random embeddings as fallback.")
+                self.embedding_model = None
+        elif config.EMBEDDINGS_BACKEND == "ollama":
+            self.embedding_model = OllamaEmbedder(config.OLLAMA_URL, config.OLLAMA_EMBEDDING_MODEL)
+        elif SENTENCE_TRANSFORMERS_AVAILABLE:
+            try:
+                # Let torch use every core for CPU inference
+                import torch
+                torch.set_num_threads(os.cpu_count() or 1)
+                
                 self.embedding_model = SentenceTransformer(config.EMBEDDINGS_MODEL)
             except Exception as e:
                 print(f"Error loading SentenceTransformer: {str(e)}")
@@ -27,25 +113,109 @@ class EmbeddingStore:
         else:
             self.embedding_model = None
         
-        # Initialize ChromaDB
-        self.chroma_client = chromadb.PersistentClient(
-            path=config.VECTOR_DB_PATH,
-            settings=Settings(anonymized_telemetry=False)
-        )
+        # Embeddings of previously ingested chunks, keyed by model and chunk text
+        self.embedding_cache = EmbeddingCache(config.EMBEDDING_CACHE_PATH)
+        model_name = {
+            "onnx-int8": config.ONNX_MODEL_PATH,
+            "ollama": config.OLLAMA_EMBEDDING_MODEL
+        }.get(config.EMBEDDINGS_BACKEND, config.EMBEDDINGS_MODEL)
+        self._embedding_cache_prefix = f"{config.EMBEDDINGS_BACKEND}:{model_name}:".encode()
         
-        # Create or get the collection
-        self.collection = self.chroma_client.get_or_create_collection(
-            name="pdf_chunks",
-            metadata={"hnsw:space": "cosine"}
-        )
+        # Initialize ChromaDB, either in-process or as a client of a Chroma server
+        if config.CHROMA_MODE == "http":
+            self.chroma_client = chromadb.HttpClient(
+                host=config.CHROMA_HOST,
+                port=config.CHROMA_PORT,
+                settings=Settings(anonymized_telemetry=False)
+            )
+        else:
+            self.chroma_client = chromadb.PersistentClient(
+                path=config.VECTOR_DB_PATH,
+                settings=Settings(anonymized_telemetry=False)
+            )
+        
+        # Create or get the collections. Chunks are sharded by filename so each
+        # HNSW index stays small; a single shard keeps the original collection name.
+        self.num_shards = max(1, config.CHROMA_SHARDS)
+        self.collections = [
+            self.chroma_client.get_or_create_collection(
+                name="pdf_chunks" if self.num_shards == 1 else f"pdf_chunks_{shard}",
+                metadata={"hnsw:space": "cosine"}
+            )
+            for shard in range(self.num_shards)
+        ]
+        self.shard_executor = ThreadPoolExecutor(max_workers=self.num_shards, thread_name_prefix="chroma-shard")
         
         # BM25 index
-        self.bm25_index = None
-        self.bm25_corpus = []
+        self.bm25_index = BM25Index()
+        self.id_to_row = {}  # Maps chunk IDs to their row in the BM25 index
+        self.row_to_id = []  # Chunk ID of each row in the BM25 index
         self.chunk_lookup = {}  # Maps chunk IDs to their original data
         
+        # The indexing thread changes the BM25 rows, their chunk id mappings and chunk_lookup
+        # together while searches read them from worker threads; both sides hold this lock
+        self._index_lock = threading.RLock()
+        
         # Document metadata
         self.document_metadata = {}  # Maps document filenames to metadata
+        
+        # Memoized results of get_document_count / get_document_list, kept up to date on mutation
+        self._doc_count = None  # Read from Chroma on first use
+        self._document_list = []
+        self._docs_dirty = True
+        
+        # Incremented on every change to the indexed documents, so dependent caches can invalidate
+        self.version = 0
+        
+        # LRU cache of query embeddings keyed by the normalized query text
+        self._embed_query_cached = functools.lru_cache(maxsize=config.QUERY_EMBEDDING_CACHE_SIZE)(self._embed_query)
+    
+    def get_shard(self, filename: str) -> int:
+        """Get the shard number of a document (stable across restarts)"""
+        return zlib.crc32(filename.encode()) % self.num_shards
+    
+    def get_collection(self, filename: str):
+        """Get the collection (shard) holding the chunks of a document"""
+        return self.collections[self.get_shard(filename)]
+    
+    def query_collections(self, query_embedding: np.ndarray, n_results: int) -> Dict[str, List[List[Any]]]:
+        """Query every shard in parallel and merge the n_results closest chunks"""
+        embeddings = [query_embedding.tolist()]
+        shard_results = list(self.shard_executor.map(
+            lambda collection: collection.query(query_embeddings=embeddings, n_results=n_results),
+            self.collections
+        ))
+        
+        ids, distances, documents, metadatas = [], [], [], []
+        for results in shard_results:
+            ids.extend(results["ids"][0])
+            distances.extend(results["distances"][0])
+            documents.extend(results["documents"][0])
+            metadatas.extend(results["metadatas"][0])
+        
+        # Keep the closest n_results across shards, ordered by distance
+        if len(ids) > n_results:
+            order = np.argpartition(np.array(distances), n_results - 1)[:n_results]
+            order = order[np.argsort(np.array(distances)[order], kind="stable")]
+        else:
+            order = np.argsort(np.array(distances), kind="stable")
+        
+        return {
+            "ids": [[ids[i] for i in order]],
+            "distances": [[distances[i] for i in order]],
+            "documents": [[documents[i] for i in order]],
+            "metadatas": [[metadatas[i] for i in order]]
+        }
+    
+    def tokenize(self, texts: List[str]) -> List[List[str]]:
+        """Tokenize texts for BM25 (lowercased, English stopwords removed, stemmed)"""
+        tokenized = []
+        for text in texts:
+            tokens = [token for token in _TOKEN_RE.findall(text.lower()) if token not in BM25_STOPWORDS]
+            if BM25_STEMMER is not None:
+                tokens = BM25_STEMMER.stemWords(tokens)
+            tokenized.append(tokens)
+        return tokenized
     
     def embed_text(self, text: str) -> np.ndarray:
         """Generate embeddings for a single text"""
@@ -55,13 +225,59 @@ class EmbeddingStore:
             # Fallback to random embeddings
             return np.random.rand(384)  # Common embedding size
     
+    def _embed_query(self, normalized_query: str) -> Tuple[float, ...]:
+        """Embed a normalized query as an immutable tuple so it can be cached"""
+        return tuple(self.embed_text(normalized_query).tolist())
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Get the (cached) embedding of a search query"""
+        normalized_query = " ".join(query.lower().split())
+        return np.array(self._embed_query_cached(normalized_query), dtype=np.float32)
+    
     def embed_texts(self, texts: List[str]) -> np.ndarray:
-        """Generate embeddings for multiple texts"""
+        """Generate embeddings for multiple texts (as float16 to halve memory)"""
         if self.embedding_model is not None:
-            return self.embedding_model.encode(texts)
+            # encode() sorts the texts by length so each batch is padded to a similar length
+            embeddings = self.embedding_model.encode(
+                texts,
+                batch_size=config.EMBEDDING_BATCH_SIZE,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
         else:
             # Fallback to random embeddings
-            return np.array([np.random.rand(384) for _ in texts])
+            embeddings = np.random.rand(len(texts), 384)
+        
+        # Normalized embeddings lose no meaningful cosine precision in float16
+        return embeddings.astype(np.float16)
+    
+    def embed_texts_cached(self, texts: List[str]) -> np.ndarray:
+        """Generate embeddings for multiple texts, reusing cached embeddings of texts seen before"""
+        if self.embedding_model is None:
+            # Random fallback embeddings are never worth caching
+            return self.embed_texts(texts)
+        
+        keys = [
+            hashlib.blake2b(self._embedding_cache_prefix + text.encode(), digest_size=16).hexdigest()
+            for text in texts
+        ]
+        cached = self.embedding_cache.get_many(keys)
+        misses = [i for i, key in enumerate(keys) if key not in cached]
+        print(f"Embedding cache: {len(texts) - len(misses)} hits, {len(misses)} misses")
+        
+        new_embeddings = self.embed_texts([texts[i] for i in misses]) if misses else None
+        if new_embeddings is not None:
+            self.embedding_cache.put_many([keys[i] for i in misses], new_embeddings)
+        
+        dim = new_embeddings.shape[1] if new_embeddings is not None else next(iter(cached.values())).shape[0]
+        embeddings = np.empty((len(texts), dim), dtype=np.float16)
+        for i, key in enumerate(keys):
+            if key in cached:
+                embeddings[i] = cached[key]
+        if new_embeddings is not None:
+            embeddings[misses] = new_embeddings
+        return embeddings
     
     def add_documents(self, chunks: List[Dict]) -> None:
         """Add document chunks to the vector store and BM25 index"""
@@ -72,57 +288,84 @@ class EmbeddingStore:
         ids = [chunk["id"] for chunk in chunks]
         texts = [chunk["text"] for chunk in chunks]
         metadatas = [chunk["metadata"] for chunk in chunks]
+        # Chroma ignores ids it already has, so only new chunks add to the count
+        new_chunk_count = len(set(ids) - self.chunk_lookup.keys())
         
         # Generate embeddings
         print("Generating embeddings...")
-        embeddings = self.embed_texts(texts)
+        embeddings = self.embed_texts_cached(texts)
         
-        # Add to ChromaDB
+        # Group the chunks by shard
         print("Adding to vector database...")
-        self.collection.add(
-            ids=ids,
-            embeddings=embeddings.tolist(),
-            documents=texts,
-            metadatas=metadatas
-        )
+        shard_indices = defaultdict(list)
+        for i, metadata in enumerate(metadatas):
+            shard_indices[self.get_shard(metadata.get("filename", ""))].append(i)
+        
+        def add_to_shard(shard: int, indices: List[int]) -> None:
+            # Add in batches. Chroma 0.4 only accepts nested float32 lists, so only
+            # one batch at a time is widened and converted to Python floats.
+            collection = self.collections[shard]
+            batch_size = config.CHROMA_BATCH_SIZE
+            for start in range(0, len(indices), batch_size):
+                batch = indices[start:start + batch_size]
+                collection.add(
+                    ids=[ids[i] for i in batch],
+                    embeddings=embeddings[batch].astype(np.float32).tolist(),
+                    documents=[texts[i] for i in batch],
+                    metadatas=[metadatas[i] for i in batch]
+                )
+        
+        # Shards are independent, so they are written in parallel
+        list(self.shard_executor.map(add_to_shard, shard_indices.keys(), shard_indices.values()))
         
         # Update BM25 index
         if config.USE_HYBRID_SEARCH:
             print("Updating BM25 index...")
-            # Tokenize texts for BM25
-            tokenized_corpus = [text.lower().split() for text in texts]
+            # Only index chunks that are new; re-uploaded chunks already have a row
+            new_indices = {}
+            for i, chunk_id in enumerate(ids):
+                if chunk_id not in self.id_to_row and chunk_id not in new_indices:
+                    new_indices[chunk_id] = i
             
-            # If BM25 index already exists, extend it
-            if self.bm25_index is not None:
-                self.bm25_corpus.extend(tokenized_corpus)
-                self.bm25_index = BM25Okapi(self.bm25_corpus)
-            else:
-                self.bm25_corpus = tokenized_corpus
-                self.bm25_index = BM25Okapi(tokenized_corpus)
+            # Tokenize the new texts, then append them to the index and map their rows together
+            tokenized = self.tokenize([texts[i] for i in new_indices.values()])
+            with self._index_lock:
+                for chunk_id in new_indices:
+                    self.id_to_row[chunk_id] = len(self.row_to_id)
+                    self.row_to_id.append(chunk_id)
+                self.bm25_index.add(tokenized)
         
         # Update chunk lookup
-        for chunk in chunks:
-            self.chunk_lookup[chunk["id"]] = chunk
+        with self._index_lock:
+            for chunk in chunks:
+                self.chunk_lookup[chunk["id"]] = chunk
+                
+                # Update document metadata
+                filename = chunk["metadata"].get("filename", "")
+                if filename and filename not in self.document_metadata:
+                    self.document_metadata[filename] = {
+                        "title": chunk["metadata"].get("title", filename),
+                        "pages": chunk["metadata"].get("pages", 0),
+                        "date_added": chunk["metadata"].get("date_added", ""),
+                        "chunk_count": 0
+                    }
+                if filename:
+                    self.document_metadata[filename]["chunk_count"] += 1
             
-            # Update document metadata
-            filename = chunk["metadata"].get("filename", "")
-            if filename and filename not in self.document_metadata:
-                self.document_metadata[filename] = {
-                    "title": chunk["metadata"].get("title", filename),
-                    "pages": chunk["metadata"].get("pages", 0),
-                    "date_added": chunk["metadata"].get("date_added", ""),
-                    "chunk_count": 0
-                }
-            if filename:
-                self.document_metadata[filename]["chunk_count"] += 1
+            self._docs_dirty = True
+            self.version += 1
+        
+        if self._doc_count is not None:
+            self._doc_count += new_chunk_count
         
         print(f"Added {len(chunks)} chunks to the database")
     
     def hybrid_search(self, query: str, top_k: int = 5) -> List[Dict]:
         """Perform hybrid search using both vector similarity and BM25"""
-        # Vector search
-        vector_results = self.collection.query(
-            query_texts=[query],
+        # Vector search with the cached query embedding
+        query_embedding = self.embed_query(query)
+        vector_results = self.query_collections(
+            query_embedding,
             n_results=top_k * 2  # Get more results to combine with BM25
         )
         
@@ -130,50 +373,66 @@ class EmbeddingStore:
             return []
         
         # BM25 search if enabled
-        if config.USE_HYBRID_SEARCH and self.bm25_index is not None:
+        if config.USE_HYBRID_SEARCH and len(self.bm25_index) > 0:
             # Tokenize query
-            tokenized_query = query.lower().split()
-            
-            # Get BM25 scores for all documents
-            bm25_scores = self.bm25_index.get_scores(tokenized_query)
-            
-            # Normalize BM25 scores to 0-1 range
-            if bm25_scores.max() > 0:
-                bm25_scores = bm25_scores / bm25_scores.max()
-            
-            # Get vector search scores
-            vector_ids = vector_results["ids"][0]
-            vector_scores = np.array(vector_results["distances"][0])
+            tokenized_query = self.tokenize([query])[0]
             
-            # Normalize vector scores (assuming they're already in 0-1 range for cosine)
-            
-            # Combine scores for the vector search results
-            combined_results = []
-            for i, doc_id in enumerate(vector_ids):
-                # Find the index of this document in the BM25 corpus
-                try:
-                    bm25_idx = list(self.chunk_lookup.keys()).index(doc_id)
-                    bm25_score = bm25_scores[bm25_idx]
-                except (ValueError, IndexError):
-                    bm25_score = 0
+            # Rows, their chunk ids and the chunk lookup must come from the same index state
+            with self._index_lock:
+                # Exact BM25 top hits via WAND instead of scoring every document
+                bm25_rows, bm25_top = self.bm25_index.top_k(tokenized_query, top_k * 4)
+                bm25_by_id = {
+                    self.row_to_id[row]: score
+                    for row, score in zip(bm25_rows.tolist(), bm25_top.tolist())
+                }
                 
-                vector_score = vector_scores[i]
+                # Candidates: the vector hits plus BM25 hits the vector search missed
+                vector_ids = vector_results["ids"][0]
+                candidate_ids = list(vector_ids)
+                texts = list(vector_results["documents"][0])
+                metadatas = list(vector_results["metadatas"][0])
+                seen = set(vector_ids)
+                for doc_id in bm25_by_id:
+                    if doc_id not in seen and doc_id in self.chunk_lookup:
+                        candidate_ids.append(doc_id)
+                        texts.append(self.chunk_lookup[doc_id]["text"])
+                        metadatas.append(self.chunk_lookup[doc_id]["metadata"])
                 
-                # Weighted combination
-                combined_score = (config.VECTOR_WEIGHT * vector_score) + (config.BM25_WEIGHT * bm25_score)
+                # Vector scores (assuming they're already in 0-1 range for cosine); BM25-only hits get 0
+                vector_scores = np.zeros(len(candidate_ids))
+                vector_scores[:len(vector_ids)] = vector_results["distances"][0]
                 
-                combined_results.append({
-                    "id": doc_id,
-                    "score": combined_score,
-                    "text": vector_results["documents"][0][i],
-                    "metadata": vector_results["metadatas"][0][i]
-                })
+                # BM25 scores of the candidates: exact scores for the vector hits' rows only
+                # (0 for chunks missing from the index), WAND scores for the BM25-only hits
+                rows = np.fromiter(
+                    (self.id_to_row.get(doc_id, -1) for doc_id in vector_ids),
+                    dtype=np.int64,
+                    count=len(vector_ids)
+                )
+                valid = rows >= 0
+                bm25_sub = np.zeros(len(candidate_ids))
+                bm25_sub[:len(vector_ids)][valid] = self.bm25_index.scores_for(rows[valid], tokenized_query)
+                bm25_sub[len(vector_ids):] = [bm25_by_id[doc_id] for doc_id in candidate_ids[len(vector_ids):]]
             
-            # Sort by combined score
-            combined_results.sort(key=lambda x: x["score"], reverse=True)
+            # Weighted combination with BM25 scores normalized to the 0-1 range
+            top_idx, top_scores = combine_scores(
+                vector_scores,
+                bm25_sub,
+                float(bm25_top[0]) if len(bm25_top) else 0.0,
+                config.VECTOR_WEIGHT,
+                config.BM25_WEIGHT,
+                top_k
+            )
             
-            # Return top_k results
-            return combined_results[:top_k]
+            return [
+                {
+                    "id": candidate_ids[i],
+                    "score": float(score),
+                    "text": texts[i],
+                    "metadata": metadatas[i]
+                }
+                for i, score in zip(top_idx, top_scores)
+            ]
         else:
             # Return vector search results only
             return [
@@ -188,10 +447,8 @@ class EmbeddingStore:
     
     def vector_search(self, query: str, top_k: int = 5) -> List[Dict]:
         """Perform vector search only"""
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=top_k
-        )
+        query_embedding = self.embed_query(query)
+        results = self.query_collections(query_embedding, n_results=top_k)
         
         if not results["ids"][0]:
             return []
@@ -218,27 +475,33 @@ class EmbeddingStore:
     
     def get_document_count(self) -> int:
         """Get the number of documents in the collection"""
-        return self.collection.count()
+        if self._doc_count is None:
+            self._doc_count = sum(collection.count() for collection in self.collections)
+        return self._doc_count
     
     def get_document_list(self) -> List[Dict]:
         """Get a list of all documents with metadata"""
-        return [
-            {
-                "filename": filename,
-                "title": metadata.get("title", filename),
-                "pages": metadata.get("pages", 0),
-                "chunks": metadata.get("chunk_count", 0),
-                "date_added": metadata.get("date_added", "")
-            }
-            for filename, metadata in self.document_metadata.items()
-        ]
+        if self._docs_dirty:
+            with self._index_lock:
+                self._document_list = [
+                    {
+                        "filename": filename,
+                        "title": metadata.get("title", filename),
+                        "pages": metadata.get("pages", 0),
+                        "chunks": metadata.get("chunk_count", 0),
+                        "date_added": metadata.get("date_added", "")
+                    }
+                    for filename, metadata in self.document_metadata.items()
+                ]
+                self._docs_dirty = False
+        return self._document_list
     
     def get_document_chunks(self, document_id: str) -> List[Dict]:
         """Get all chunks for a document by document ID"""
         # In a real implementation, we would query the database
         # For now, we'll use a mock approach
-        if document_id in self.chunk_lookup:
-            chunk = self.chunk_lookup[document_id]
+        chunk = self.chunk_lookup.get(document_id)
+        if chunk is not None:
             filename = chunk["metadata"].get("filename", "")
             return self.get_document_chunks_by_filename(filename)
         return []
@@ -247,17 +510,13 @@ class EmbeddingStore:
         """Get all chunks for a document by filename"""
         # Query ChromaDB for all chunks with this filename
         try:
-            results = self.collection.get(
+            results = self.get_collection(filename).get(
                 where={"filename": filename}
             )
             
             if not results["ids"]:
                 # Fallback to searching in chunk_lookup
-                chunks = []
-                for chunk_id, chunk in self.chunk_lookup.items():
-                    if chunk["metadata"].get("filename") == filename:
-                        chunks.append(chunk)
-                return chunks
+                return self._lookup_chunks_by_filename(filename)
             
             # Format results
             return [
@@ -272,11 +531,15 @@ class EmbeddingStore:
             print(f"Error getting document chunks: {str(e)}")
             
             # Fallback to searching in chunk_lookup
-            chunks = []
-            for chunk_id, chunk in self.chunk_lookup.items():
-                if chunk["metadata"].get("filename") == filename:
-                    chunks.append(chunk)
-            return chunks
+            return self._lookup_chunks_by_filename(filename)
+    
+    def _lookup_chunks_by_filename(self, filename: str) -> List[Dict]:
+        """Chunks of a document from chunk_lookup, which ingest and delete may be changing"""
+        with self._index_lock:
+            return [
+                chunk for chunk in self.chunk_lookup.values()
+                if chunk["metadata"].get("filename") == filename
+            ]
     
     def delete_document(self, filename: str) -> bool:
         """Delete a document and all its chunks"""
@@ -289,29 +552,29 @@ class EmbeddingStore:
             
             # Delete from ChromaDB
             chunk_ids = [chunk["id"] for chunk in chunks]
-            self.collection.delete(ids=chunk_ids)
-            
-            # Remove from chunk_lookup
-            for chunk_id in chunk_ids:
-                if chunk_id in self.chunk_lookup:
-                    del self.chunk_lookup[chunk_id]
+            self.get_collection(filename).delete(ids=chunk_ids)
+            if self._doc_count is not None:
+                self._doc_count = max(self._doc_count - len(chunk_ids), 0)
             
-            # Remove from document_metadata
-            if filename in self.document_metadata:
-                del self.document_metadata[filename]
-            
-            # Rebuild BM25 index
-            if config.USE_HYBRID_SEARCH and self.bm25_index is not None:
-                # This is inefficient but simple - in a real implementation we would
-                # have a more efficient way to update the BM25 index
-                self.bm25_corpus = []
-                for chunk in self.chunk_lookup.values():
-                    self.bm25_corpus.append(chunk["text"].lower().split())
+            with self._index_lock:
+                # Remove from chunk_lookup
+                for chunk_id in chunk_ids:
+                    if chunk_id in self.chunk_lookup:
+                        del self.chunk_lookup[chunk_id]
+                
+                # Remove from document_metadata
+                if filename in self.document_metadata:
+                    del self.document_metadata[filename]
                 
-                if self.bm25_corpus:
-                    self.bm25_index = BM25Okapi(self.bm25_corpus)
-                else:
-                    self.bm25_index = None
+                # Remove the rows from the BM25 index and renumber the remaining ones
+                removed_rows = [self.id_to_row.pop(chunk_id) for chunk_id in chunk_ids if chunk_id in self.id_to_row]
+                if removed_rows:
+                    self.bm25_index.remove(removed_rows)
+                    self.row_to_id = sorted(self.id_to_row, key=self.id_to_row.get)
+                    self.id_to_row = {chunk_id: row for row, chunk_id in enumerate(self.row_to_id)}
+                
+                self._docs_dirty = True
+                self.version += 1
             
             return True
         except Exception as e:
@@ -320,32 +583,98 @@ class EmbeddingStore:
     
     def save_state(self) -> None:
         """Save the BM25 index and chunk lookup to disk"""
-        if self.bm25_index is not None:
-            state = {
-                "bm25_corpus": self.bm25_corpus,
-                "chunk_lookup": self.chunk_lookup,
-                "document_metadata": self.document_metadata
-            }
-            
-            with open(os.path.join(config.MODELS_DIR, "bm25_state.pkl"), "wb") as f:
-                pickle.dump(state, f)
+        # Chunks go to a columnar Arrow IPC file that can be memory-mapped on load
+        chunk_ids = list(self.chunk_lookup)
+        table = pa.table(
+            {
+                "id": pa.array(chunk_ids, type=pa.string()),
+                "text": pa.array([self.chunk_lookup[c]["text"] for c in chunk_ids], type=pa.string()),
+                "metadata": pa.array([json.dumps(self.chunk_lookup[c]["metadata"]) for c in chunk_ids], type=pa.string()),
+                "bm25_row": pa.array([self.id_to_row.get(c, -1) for c in chunk_ids], type=pa.int64())
+            },
+            metadata={"document_metadata": json.dumps(self.document_metadata)}
+        )
+        tmp_path = STATE_PATH + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, STATE_PATH)
+        
+        # The BM25 index goes to compressed-sparse-row arrays
+        tmp_path = BM25_STATE_PATH + ".tmp.npz"
+        np.savez(tmp_path, **self.bm25_index.get_arrays())
+        os.replace(tmp_path, BM25_STATE_PATH)
+        
+        if os.path.isdir(LEGACY_BM25S_INDEX_DIR):
+            shutil.rmtree(LEGACY_BM25S_INDEX_DIR, ignore_errors=True)
     
     def load_state(self) -> bool:
         """Load the BM25 index and chunk lookup from disk"""
+        if not os.path.exists(STATE_PATH):
+            return self.load_legacy_state()
+        
+        try:
+            # Memory-map the Arrow file instead of reading it into Python objects first
+            with pa.memory_map(STATE_PATH, "r") as source:
+                table = ipc.open_file(source).read_all()
+            
+            ids = table.column("id").to_pylist()
+            texts = table.column("text").to_pylist()
+            metadatas = table.column("metadata").to_pylist()
+            rows = table.column("bm25_row").to_pylist()
+            
+            self.chunk_lookup = {
+                chunk_id: {"id": chunk_id, "text": text, "metadata": json.loads(metadata)}
+                for chunk_id, text, metadata in zip(ids, texts, metadatas)
+            }
+            self.id_to_row = {chunk_id: row for chunk_id, row in zip(ids, rows) if row >= 0}
+            self.row_to_id = sorted(self.id_to_row, key=self.id_to_row.get)
+            self.document_metadata = json.loads(table.schema.metadata[b"document_metadata"])
+            self._docs_dirty = True
+            self.version += 1
+            
+            if os.path.exists(BM25_STATE_PATH):
+                with np.load(BM25_STATE_PATH) as arrays:
+                    self.bm25_index = BM25Index.from_arrays(arrays)
+            else:
+                # The loaded rows would point into an empty index
+                print("BM25 index file missing, rebuilding it from the stored chunks...")
+                self.rebuild_bm25_index()
+            
+            return True
+        except Exception as e:
+            print(f"Error loading state: {str(e)}")
+            return False
+    
+    def rebuild_bm25_index(self) -> None:
+        """Tokenize every chunk in chunk_lookup into a new BM25 index"""
+        chunk_ids = list(self.chunk_lookup)
+        bm25_index = BM25Index()
+        bm25_index.add(self.tokenize([self.chunk_lookup[chunk_id]["text"] for chunk_id in chunk_ids]))
+        with self._index_lock:
+            self.bm25_index = bm25_index
+            self.row_to_id = chunk_ids
+            self.id_to_row = {chunk_id: row for row, chunk_id in enumerate(chunk_ids)}
+    
+    def load_legacy_state(self) -> bool:
+        """Load state saved by older versions as a single pickle file"""
         state_path = os.path.join(config.MODELS_DIR, "bm25_state.pkl")
         if os.path.exists(state_path):
             try:
                 with open(state_path, "rb") as f:
                     state = pickle.load(f)
                 
-                self.bm25_corpus = state["bm25_corpus"]
                 self.chunk_lookup = state["chunk_lookup"]
+                self.version += 1
+                
+                # Pickled indexes and corpora were tokenized differently (e.g. text.lower().split(),
+                # keeping punctuation and without stemming) and would not match current queries
+                print("Rebuilding the BM25 index from the stored chunks...")
+                self.rebuild_bm25_index()
                 
                 if "document_metadata" in state:
                     self.document_metadata = state["document_metadata"]
-                
-                if self.bm25_corpus:
-                    self.bm25_index = BM25Okapi(self.bm25_corpus)
+                    self._docs_dirty = True
                 
                 return True
             except Exception as e:
@@ -353,7 +682,6 @@ class EmbeddingStore:
                 return False
         return False
 
-
 # For testing
 if __name__ == "__main__":
     store = EmbeddingStore()
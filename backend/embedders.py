@@ -0,0 +1,86 @@
+from typing import List, Union
+import numpy as np
+import requests
+
+class OnnxEmbedder:
+    """Sentence embeddings from an int8-quantized ONNX export of the embedding model.
+
+    Export and quantize the model once with:
+        optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 models/onnx/
+        optimum-cli onnxruntime quantize --onnx_model models/onnx/ --avx512_vnni -o models/onnx-int8/
+    """
+
+    def __init__(self, model_path: str):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        self.model = ORTModelForFeatureExtraction.from_pretrained(model_path)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Run one batch through the model and mean-pool the token embeddings"""
+        inputs = self.tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+        outputs = self.model(**inputs)
+        token_embeddings = np.asarray(outputs.last_hidden_state)
+
+        # Mean pooling over the non-padding tokens
+        mask = inputs["attention_mask"][..., None].astype(token_embeddings.dtype)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        return summed / counts
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        """Embed one text or a list of texts (mirrors SentenceTransformer.encode)"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        # Sort by length so each batch is padded to a similar length
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        batches = [
+            self._encode_batch([texts[i] for i in order[start:start + batch_size]])
+            for start in range(0, len(texts), batch_size)
+        ]
+        embeddings = np.empty((len(texts), batches[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.concatenate(batches)
+
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+
+        return embeddings[0] if single else embeddings
+
+class OllamaEmbedder:
+    """Embeddings from an Ollama server, sent in batches to the /api/embed endpoint"""
+
+    def __init__(self, base_url: str, model: str):
+        self.url = f"{base_url}/api/embed"
+        self.model = model
+        self.session = requests.Session()
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed one batch with a single request"""
+        response = self.session.post(self.url, json={"model": self.model, "input": texts}, timeout=300)
+        response.raise_for_status()
+        return np.array(response.json()["embeddings"], dtype=np.float32)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        """Embed one text or a list of texts (mirrors SentenceTransformer.encode)"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        embeddings = np.concatenate([
+            self._encode_batch(texts[start:start + batch_size])
+            for start in range(0, len(texts), batch_size)
+        ])
+
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+
+        return embeddings[0] if single else embeddings
@@ -0,0 +1,43 @@
+import sqlite3
+import threading
+from typing import Dict, List
+import numpy as np
+
+class EmbeddingCache:
+    """On-disk cache of chunk embeddings (float16 blobs) keyed by a hash of the chunk content"""
+
+    # Stay below SQLite's limit on the number of parameters per statement
+    QUERY_BATCH_SIZE = 500
+
+    def __init__(self, path: str):
+        # The store is written from the indexing thread but created on the main thread
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache (key TEXT PRIMARY KEY, embedding BLOB NOT NULL)"
+        )
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Get the cached embeddings of the given keys (missing keys are left out)"""
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), self.QUERY_BATCH_SIZE):
+                batch = keys[start:start + self.QUERY_BATCH_SIZE]
+                rows = self.conn.execute(
+                    f"SELECT key, embedding FROM embedding_cache WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float16)
+        return found
+
+    def put_many(self, keys: List[str], embeddings: np.ndarray) -> None:
+        """Store embeddings, keeping existing entries for keys that are already cached"""
+        embeddings = embeddings.astype(np.float16, copy=False)
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO embedding_cache (key, embedding) VALUES (?, ?)",
+                ((key, embedding.tobytes()) for key, embedding in zip(keys, embeddings))
+            )
+            self.conn.commit()
@@ -1,17 +1,23 @@
 import os
+import orjson
+import asyncio
 import tempfile
-import shutil
-from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+import aiofiles
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import uvicorn
 import config
 from process_pdf import PDFProcessor
 from embed_store import EmbeddingStore
-from query_handler import QueryHandler
+from query_handler import QueryHandler, async_http_client
 
-app = FastAPI(title="PDF Research Assistant API")
+app = FastAPI(title="PDF Research Assistant API", default_response_class=ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -30,6 +36,40 @@ query_handler = QueryHandler(embedding_store)
 # Try to load BM25 state if it exists
 embedding_store.load_state()
 
+# Single worker thread that owns every write to the embedding store, so ingestion,
+# deletes and state saves never interleave and never block the event loop
+indexing_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="indexing")
+
+# Debounced state saving: a burst of uploads/deletes produces one pickle write.
+# _save_pending marks a change not yet handed to the executor; once shutdown starts
+# no new timer is armed and flush_state writes any pending change itself.
+_save_timer: Optional[threading.Timer] = None
+_save_lock = threading.Lock()
+_save_pending = False
+_shutting_down = False
+
+def _submit_save_state():
+    """Timer callback: hand the save to the indexing worker unless shutdown already began"""
+    global _save_pending
+    with _save_lock:
+        if _shutting_down:
+            return
+        _save_pending = False
+        indexing_executor.submit(embedding_store.save_state)
+
+def schedule_save_state():
+    """Save the BM25 state once no further change arrived for SAVE_STATE_DELAY seconds"""
+    global _save_timer, _save_pending
+    with _save_lock:
+        _save_pending = True
+        if _shutting_down:
+            return
+        if _save_timer is not None:
+            _save_timer.cancel()
+        _save_timer = threading.Timer(config.SAVE_STATE_DELAY, _submit_save_state)
+        _save_timer.daemon = True
+        _save_timer.start()
+
 # Pydantic models for API
 class QuestionRequest(BaseModel):
     question: str
@@ -69,10 +109,8 @@ def process_pdfs_task(file_paths: List[str], use_pdfplumber: bool = False,
                       chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None):
     try:
         # Update chunking parameters if provided
-        if chunk_size is not None:
-            pdf_processor.text_splitter.chunk_size = chunk_size
-        if chunk_overlap is not None:
-            pdf_processor.text_splitter.chunk_overlap = chunk_overlap
+        if chunk_size is not None or chunk_overlap is not None:
+            pdf_processor.set_chunking(*resolve_chunking(chunk_size, chunk_overlap))
             
         # Process PDFs
         chunks = pdf_processor.process_multiple_pdfs(file_paths, use_pdfplumber)
@@ -81,18 +119,103 @@ def process_pdfs_task(file_paths: List[str], use_pdfplumber: bool = False,
         embedding_store.add_documents(chunks)
         
         # Save BM25 state
-        embedding_store.save_state()
-        
+        schedule_save_state()
+    except Exception as e:
+        print(f"Error in background task: {str(e)}")
+    finally:
         # Clean up temporary files
         for file_path in file_paths:
             if os.path.exists(file_path):
                 os.remove(file_path)
+
+def resolve_chunking(chunk_size: Optional[int], chunk_overlap: Optional[int]) -> Tuple[int, int]:
+    """Fill in unset chunking parameters from the current ones"""
+    return (
+        chunk_size if chunk_size is not None else pdf_processor.chunk_size,
+        chunk_overlap if chunk_overlap is not None else pdf_processor.chunk_overlap
+    )
+
+def check_chunking(chunk_size: int, chunk_overlap: int) -> None:
+    """Reject chunking parameters the text splitter cannot use with a 400"""
+    try:
+        PDFProcessor.validate_chunking(chunk_size, chunk_overlap)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def copy_with_sendfile(src_fd: int, dst_path: str) -> None:
+    """Copy a file descriptor into dst_path inside the kernel, without Python buffers"""
+    size = os.fstat(src_fd).st_size
+    with open(dst_path, "wb") as dst:
+        offset = 0
+        while offset < size:
+            sent = os.sendfile(dst.fileno(), src_fd, offset, size - offset)
+            if sent == 0:
+                break
+            offset += sent
+
+async def save_upload(file: UploadFile) -> str:
+    """Write an uploaded file to a temporary PDF and return its path"""
+    fd, temp_path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    
+    # Starlette spools large uploads to a real temporary file; those can be
+    # copied with sendfile. Small uploads are still in memory.
+    if hasattr(os, "sendfile") and getattr(file.file, "_rolled", False):
+        try:
+            await run_in_threadpool(copy_with_sendfile, file.file.fileno(), temp_path)
+            return temp_path
+        except OSError:
+            await file.seek(0)
+    
+    # Copy uploaded file content in 1MB chunks without blocking the event loop
+    async with aiofiles.open(temp_path, "wb") as temp_file:
+        while chunk := await file.read(1024 * 1024):
+            await temp_file.write(chunk)
+    return temp_path
+
+async def preload_llm():
+    """Load the Ollama model now so the first question does not pay the model load time"""
+    try:
+        # An empty prompt loads the model without generating anything
+        response = await async_http_client.post(
+            f"{config.OLLAMA_URL}/api/generate",
+            json={"model": config.DEFAULT_LLM_MODEL, "prompt": "", "keep_alive": config.OLLAMA_KEEP_ALIVE}
+        )
+        response.raise_for_status()
+        print(f"Preloaded Ollama model {config.DEFAULT_LLM_MODEL}")
     except Exception as e:
-        print(f"Error in background task: {str(e)}")
+        print(f"Error preloading Ollama model: {str(e)}")
+
+@app.on_event("startup")
+async def start_llm_preload():
+    """Preload the local LLM in the background without delaying startup"""
+    if config.USE_LOCAL_LLM:
+        app.state.llm_preload = asyncio.create_task(preload_llm())
+
+@app.on_event("shutdown")
+def flush_state():
+    """Write any pending state change before the server exits"""
+    global _shutting_down
+    with _save_lock:
+        _shutting_down = True
+        if _save_timer is not None:
+            _save_timer.cancel()
+    
+    # Let queued ingestion, deletes and already submitted saves finish first
+    indexing_executor.shutdown(wait=True)
+    pdf_processor.shutdown()
+    with _save_lock:
+        pending = _save_pending
+    if pending:
+        embedding_store.save_state()
+
+@app.on_event("shutdown")
+async def close_http_client():
+    """Close the pooled LLM API connections"""
+    await async_http_client.aclose()
 
 @app.post("/upload-pdfs", response_model=ProcessingStatus)
 async def upload_pdfs(
-    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     use_pdfplumber: bool = Form(False),
     chunk_size: Optional[int] = Form(None),
@@ -101,24 +224,20 @@ async def upload_pdfs(
     """Upload and process multiple PDF files"""
     if not files:
         raise HTTPException(status_code=400, detail="No files provided")
+    if chunk_size is not None or chunk_overlap is not None:
+        check_chunking(*resolve_chunking(chunk_size, chunk_overlap))
     
-    # Save uploaded files to temporary location
-    temp_file_paths = []
-    for file in files:
-        if not file.filename.lower().endswith(".pdf"):
-            continue
-        
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-            # Copy uploaded file content to temporary file
-            shutil.copyfileobj(file.file, temp_file)
-            temp_file_paths.append(temp_file.name)
+    # Save uploaded files to temporary location, all files concurrently
+    temp_file_paths = await asyncio.gather(
+        *[save_upload(file) for file in files if file.filename.lower().endswith(".pdf")]
+    )
     
     if not temp_file_paths:
         raise HTTPException(status_code=400, detail="No valid PDF files provided")
     
-    # Process PDFs in background
-    background_tasks.add_task(
+    # Process PDFs in background on the indexing worker
+    asyncio.get_running_loop().run_in_executor(
+        indexing_executor,
         process_pdfs_task, 
         temp_file_paths, 
         use_pdfplumber,
@@ -129,7 +248,7 @@ async def upload_pdfs(
     return {
         "status": "processing",
         "message": f"Processing {len(temp_file_paths)} PDF files in the background",
-        "document_count": embedding_store.get_document_count()
+        "document_count": await run_in_threadpool(embedding_store.get_document_count)
     }
 
 @app.post("/ask", response_model=QuestionResponse)
@@ -139,7 +258,7 @@ async def ask_question(request: QuestionRequest):
         raise HTTPException(status_code=400, detail="Question cannot be empty")
     
     # Check if we have documents
-    if embedding_store.get_document_count() == 0:
+    if await run_in_threadpool(embedding_store.get_document_count) == 0:
         return {
             "answer": "No documents have been uploaded yet. Please upload PDF documents first.",
             "citations": [],
@@ -147,9 +266,35 @@ async def ask_question(request: QuestionRequest):
         }
     
     # Answer the question
-    result = query_handler.answer_question(request.question, request.top_k)
+    result = await query_handler.aanswer_question(request.question, request.top_k)
     return result
 
+@app.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """Ask a question and stream the answer as newline-delimited JSON.
+    
+    Each line is a JSON object: {"delta": ...} for each piece of the answer, then
+    {"done": true, "error": ..., "answer": ..., "citations": ..., "retrieved_docs": ...} at the end.
+    "error" is true when generating the answer failed partway; such answers must not be cached.
+    """
+    if not request.question:
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    
+    def ndjson(event: Dict[str, Any]) -> bytes:
+        return orjson.dumps(event, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+    
+    async def events():
+        if await run_in_threadpool(embedding_store.get_document_count) == 0:
+            answer = "No documents have been uploaded yet. Please upload PDF documents first."
+            yield ndjson({"delta": answer})
+            yield ndjson({"done": True, "error": False, "answer": answer, "citations": [], "retrieved_docs": []})
+            return
+        
+        async for event in query_handler.aanswer_question_stream(request.question, request.top_k):
+            yield ndjson(event)
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 @app.get("/documents", response_model=DocumentListResponse)
 async def get_documents():
     """Get a list of all documents"""
@@ -159,10 +304,12 @@ async def get_documents():
 @app.delete("/documents/{filename}")
 async def delete_document(filename: str):
     """Delete a document and all its chunks"""
-    success = embedding_store.delete_document(filename)
+    success = await asyncio.get_running_loop().run_in_executor(
+        indexing_executor, embedding_store.delete_document, filename
+    )
     if success:
         # Save state after deletion
-        embedding_store.save_state()
+        schedule_save_state()
         return {"status": "success", "message": f"Document {filename} deleted successfully"}
     else:
         raise HTTPException(status_code=404, detail=f"Document {filename} not found")
@@ -173,7 +320,7 @@ async def summarize_document(request: SummaryRequest):
     if not request.document_id and not request.filename:
         raise HTTPException(status_code=400, detail="Either document_id or filename must be provided")
     
-    result = query_handler.summarize_document(request.document_id, request.filename)
+    result = await query_handler.asummarize_document(request.document_id, request.filename)
     
     if not result["document_id"] and not result["title"]:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -183,8 +330,8 @@ async def summarize_document(request: SummaryRequest):
 @app.post("/chunking-config")
 async def update_chunking_config(config: ChunkingConfig):
     """Update the chunking configuration"""
-    pdf_processor.text_splitter.chunk_size = config.chunk_size
-    pdf_processor.text_splitter.chunk_overlap = config.chunk_overlap
+    check_chunking(config.chunk_size, config.chunk_overlap)
+    pdf_processor.set_chunking(config.chunk_size, config.chunk_overlap)
     
     return {
         "status": "success", 
@@ -196,7 +343,7 @@ async def update_chunking_config(config: ChunkingConfig):
 @app.get("/status", response_model=ProcessingStatus)
 async def get_status():
     """Get the current status of the system"""
-    document_count = embedding_store.get_document_count()
+    document_count = await run_in_threadpool(embedding_store.get_document_count)
     return {
         "status": "ready",
         "message": f"System is ready with {document_count} document chunks",
@@ -1,25 +1,89 @@
 import os
+import bisect
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import fitz  # PyMuPDF
 import pdfplumber
 from typing import List, Dict, Tuple, Optional
 import hashlib
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+try:
+    from semantic_text_splitter import TextSplitter
+    SEMANTIC_SPLITTER_AVAILABLE = True
+except ImportError:
+    print("Warning: semantic-text-splitter not available. Falling back to LangChain's text splitter.")
+    SEMANTIC_SPLITTER_AVAILABLE = False
 from tqdm import tqdm
 import config
 
+def _join_pages(pages: List[Tuple[int, str]]) -> Tuple[str, List[Tuple[int, int]]]:
+    """Join (page number, text) pairs and record the character offset where each page starts"""
+    parts = []
+    page_offsets = []
+    offset = 0
+    for page_num, text in pages:
+        if parts:
+            parts.append("\n\n")
+            offset += 2
+        page_offsets.append((offset, page_num))
+        parts.append(text)
+        offset += len(text)
+    return "".join(parts), page_offsets
+
+# Plain-text extraction flags: no image placeholders, ligatures expanded to their letters
+PYMUPDF_TEXT_FLAGS = fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_IMAGES & ~fitz.TEXT_PRESERVE_LIGATURES
+
+# Per-process PDFProcessor instances used by the worker pool, keyed by chunking parameters
+_worker_processors: Dict[Tuple[int, int], "PDFProcessor"] = {}
+
+def _process_pdf_worker(pdf_path: str, use_pdfplumber: bool, chunk_size: int, chunk_overlap: int) -> List[Dict]:
+    """Process one PDF inside a worker process"""
+    key = (chunk_size, chunk_overlap)
+    if key not in _worker_processors:
+        _worker_processors[key] = PDFProcessor(chunk_size, chunk_overlap)
+    return _worker_processors[key].process_pdf(pdf_path, use_pdfplumber)
+
 class PDFProcessor:
-    def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.CHUNK_SIZE,
-            chunk_overlap=config.CHUNK_OVERLAP,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+    def __init__(self, chunk_size: int = config.CHUNK_SIZE, chunk_overlap: int = config.CHUNK_OVERLAP):
+        self.set_chunking(chunk_size, chunk_overlap)
+        self._pool = None  # Worker processes, started on the first multi-PDF batch
     
-    def extract_text_pymupdf(self, pdf_path: str) -> Tuple[str, Dict]:
-        """Extract text from PDF using PyMuPDF (faster but less accurate with complex layouts)"""
-        doc = fitz.open(pdf_path)
-        metadata = {
+    @staticmethod
+    def validate_chunking(chunk_size: int, chunk_overlap: int) -> None:
+        """Raise ValueError unless 0 <= chunk_overlap < chunk_size (both splitters require it)"""
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError(
+                f"chunk_overlap must be at least 0 and smaller than chunk_size ({chunk_size}), got {chunk_overlap}"
+            )
+    
+    def set_chunking(self, chunk_size: int, chunk_overlap: int) -> None:
+        """Set the chunking parameters used for subsequent PDFs (ValueError if they are invalid)"""
+        self.validate_chunking(chunk_size, chunk_overlap)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        if SEMANTIC_SPLITTER_AVAILABLE:
+            # Rust splitter measuring characters, so splitting never calls back into Python
+            self.text_splitter = TextSplitter(chunk_size, overlap=chunk_overlap)
+        else:
+            self.text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                length_function=len,
+                separators=["\n\n", "\n", " ", ""]
+            )
+    
+    def split_text(self, text: str) -> List[str]:
+        """Split text into chunks with whichever splitter is configured"""
+        if SEMANTIC_SPLITTER_AVAILABLE:
+            return self.text_splitter.chunks(text)
+        return self.text_splitter.split_text(text)
+    
+    @staticmethod
+    def _pymupdf_metadata(doc: fitz.Document, pdf_path: str) -> Dict:
+        """Build the metadata dict of an open PyMuPDF document"""
+        return {
             "title": doc.metadata.get("title", ""),
             "author": doc.metadata.get("author", ""),
             "subject": doc.metadata.get("subject", ""),
@@ -28,17 +92,28 @@ class PDFProcessor:
             "pages": len(doc),
             "filename": os.path.basename(pdf_path)
         }
+    
+    def get_metadata(self, pdf_path: str) -> Dict:
+        """Read only the metadata and page count of a PDF, without touching its pages"""
+        with fitz.open(pdf_path) as doc:
+            return self._pymupdf_metadata(doc, pdf_path)
+    
+    def extract_text_pymupdf(self, pdf_path: str) -> Tuple[str, List[Tuple[int, int]], Dict]:
+        """Extract text from PDF using PyMuPDF (faster but less accurate with complex layouts)"""
+        # The context manager closes the document even if extraction fails
+        with fitz.open(pdf_path) as doc:
+            metadata = self._pymupdf_metadata(doc, pdf_path)
+            
+            pages = []
+            for page_num, page in enumerate(doc):
+                text = page.get_text("text", flags=PYMUPDF_TEXT_FLAGS)
+                if text.strip():  # Only add non-empty pages
+                    pages.append((page_num + 1, text))
         
-        full_text = ""
-        for page_num, page in enumerate(doc):
-            text = page.get_text()
-            if text.strip():  # Only add non-empty pages
-                full_text += f"\n\n--- Page {page_num + 1} ---\n\n{text}"
-        
-        doc.close()
-        return full_text, metadata
+        full_text, page_offsets = _join_pages(pages)
+        return full_text, page_offsets, metadata
     
-    def extract_text_pdfplumber(self, pdf_path: str) -> Tuple[str, Dict]:
+    def extract_text_pdfplumber(self, pdf_path: str) -> Tuple[str, List[Tuple[int, int]], Dict]:
         """Extract text from PDF using pdfplumber (better for complex layouts)"""
         with pdfplumber.open(pdf_path) as pdf:
             metadata = {
@@ -46,40 +121,49 @@ class PDFProcessor:
                 "filename": os.path.basename(pdf_path)
             }
             
-            full_text = ""
+            pages = []
             for page_num, page in enumerate(pdf.pages):
+                # Pages without any characters (blank or scanned) skip the costly layout analysis
+                if not page.chars:
+                    continue
                 text = page.extract_text() or ""
                 if text.strip():  # Only add non-empty pages
-                    full_text += f"\n\n--- Page {page_num + 1} ---\n\n{text}"
+                    pages.append((page_num + 1, text))
         
-        return full_text, metadata
+        full_text, page_offsets = _join_pages(pages)
+        return full_text, page_offsets, metadata
     
-    def extract_text(self, pdf_path: str, use_pdfplumber: bool = False) -> Tuple[str, Dict]:
-        """Extract text from PDF using the specified method"""
+    def extract_text(self, pdf_path: str, use_pdfplumber: bool = False) -> Tuple[str, List[Tuple[int, int]], Dict]:
+        """Extract text from PDF using the specified method, with the (char offset, page number) of each page"""
         if use_pdfplumber:
             return self.extract_text_pdfplumber(pdf_path)
         else:
             return self.extract_text_pymupdf(pdf_path)
     
-    def chunk_text(self, text: str, metadata: Dict) -> List[Dict]:
-        """Split text into chunks using LangChain's RecursiveCharacterTextSplitter"""
-        chunks = self.text_splitter.split_text(text)
+    def chunk_text(self, text: str, metadata: Dict, page_offsets: Optional[List[Tuple[int, int]]] = None) -> List[Dict]:
+        """Split text into chunks with metadata and page info"""
+        chunks = self.split_text(text)
+        page_starts = [offset for offset, _ in page_offsets or []]
         
         # Create document chunks with metadata and page info
         doc_chunks = []
+        filename_bytes = metadata["filename"].encode()
+        chunk_start = 0
         for i, chunk in enumerate(chunks):
-            # Extract page number from chunk if available
-            page_match = None
-            for line in chunk.split('\n'):
-                if line.startswith("--- Page ") and line.endswith(" ---"):
-                    try:
-                        page_match = int(line.replace("--- Page ", "").replace(" ---", ""))
-                        break
-                    except:
-                        pass
+            # Chunks appear in order (possibly overlapping), so each one is found after the previous start
+            found = text.find(chunk, chunk_start + 1 if i else 0)
+            if found >= 0:
+                chunk_start = found
+            
+            # Page containing the start of the chunk
+            page_index = bisect.bisect_right(page_starts, chunk_start) - 1
+            page = page_offsets[page_index][1] if page_index >= 0 else "unknown"
             
             # Create a unique ID for the chunk
-            chunk_id = hashlib.md5(f"{metadata['filename']}_{i}_{chunk[:100]}".encode()).hexdigest()
+            chunk_id = hashlib.blake2b(
+                filename_bytes + i.to_bytes(4, "little") + chunk[:100].encode(),
+                digest_size=16
+            ).hexdigest()
             
             doc_chunks.append({
                 "id": chunk_id,
@@ -87,7 +171,7 @@ class PDFProcessor:
                 "metadata": {
                     **metadata,
                     "chunk_id": i,
-                    "page": page_match if page_match else "unknown"
+                    "page": page
                 }
             })
         
@@ -95,14 +179,36 @@ class PDFProcessor:
     
     def process_pdf(self, pdf_path: str, use_pdfplumber: bool = False) -> List[Dict]:
         """Process a PDF file: extract text and split into chunks with metadata"""
-        text, metadata = self.extract_text(pdf_path, use_pdfplumber)
-        chunks = self.chunk_text(text, metadata)
+        text, page_offsets, metadata = self.extract_text(pdf_path, use_pdfplumber)
+        chunks = self.chunk_text(text, metadata, page_offsets)
         return chunks
     
     def process_multiple_pdfs(self, pdf_paths: List[str], use_pdfplumber: bool = False) -> List[Dict]:
         """Process multiple PDF files and return all chunks"""
         all_chunks = []
         
+        # Parsing is CPU-bound, so PDFs are spread over worker processes
+        if len(pdf_paths) > 1 and config.PDF_WORKERS > 1:
+            if self._pool is None:
+                # "spawn" avoids forking the threads of the calling (server) process
+                self._pool = ProcessPoolExecutor(
+                    max_workers=config.PDF_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            futures = {
+                self._pool.submit(_process_pdf_worker, pdf_path, use_pdfplumber, self.chunk_size, self.chunk_overlap): pdf_path
+                for pdf_path in pdf_paths
+            }
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Processing PDFs"):
+                pdf_path = futures[future]
+                try:
+                    chunks = future.result()
+                    all_chunks.extend(chunks)
+                    print(f"Processed {pdf_path}: {len(chunks)} chunks extracted")
+                except Exception as e:
+                    print(f"Error processing {pdf_path}: {str(e)}")
+            return all_chunks
+        
         for pdf_path in tqdm(pdf_paths, desc="Processing PDFs"):
             try:
                 chunks = self.process_pdf(pdf_path, use_pdfplumber)
@@ -112,6 +218,12 @@ class PDFProcessor:
                 print(f"Error processing {pdf_path}: {str(e)}")
         
         return all_chunks
+    
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
 
 
 # For testing
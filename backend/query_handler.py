@@ -1,11 +1,39 @@
 import os
-import json
-import requests
-from typing import List, Dict, Any, Optional, Tuple
+import orjson
+import asyncio
+import hashlib
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+import httpx
+import numpy as np
 import ollama
-from langchain.prompts import PromptTemplate
 import config
 from embed_store import EmbeddingStore
+from answer_cache import AnswerCache
+
+OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
+
+# Static instructions sent as the system message. They never change between requests,
+# so providers with automatic prefix caching can reuse them; per-request context goes last.
+RAG_SYSTEM_PROMPT = """You are a helpful research assistant. Use the provided context to answer the question. 
+If you don't know the answer based on the context, just say that you don't know, don't try to make up an answer.
+Always include citations to the source documents in your answer, using the format [Document: Title, Page: X]."""
+
+SUMMARY_SYSTEM_PROMPT = """You are a helpful research assistant. Please provide a concise summary of the provided document. 
+Focus on the main topics, key findings, and important concepts. The summary should be informative and highlight the most 
+important aspects of the document."""
+
+SECTION_SUMMARY_SYSTEM_PROMPT = """You are a helpful research assistant. Please summarize the provided section of a longer document. 
+Keep the main topics, key findings, and important concepts so the section summaries can later be combined into one summary."""
+
+# Shared async HTTP client: keeps HTTP/2 connections to the LLM API alive between requests
+async_http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=40),
+    timeout=300.0
+)
+
+class LLMStreamError(Exception):
+    """A streamed LLM response failed; the message is the error text shown to the user"""
 
 class QueryHandler:
     def __init__(self, embedding_store: EmbeddingStore):
@@ -14,48 +42,46 @@ class QueryHandler:
         # Configure Ollama client for Docker
         if hasattr(config, 'OLLAMA_URL'):
             ollama.host = config.OLLAMA_URL
+        self.async_ollama = ollama.AsyncClient(host=config.OLLAMA_URL)
         
-        # Define the RAG prompt template
-        self.rag_template = PromptTemplate(
-            input_variables=["context", "question"],
-            template="""You are a helpful research assistant. Use the following context to answer the question. 
-If you don't know the answer based on the context, just say that you don't know, don't try to make up an answer.
-Always include citations to the source documents in your answer, using the format [Document: Title, Page: X].
-
-Context:
-{context}
-
-Question: {question}
-
-Answer:"""
-        )
+        # Answers to previous questions, reused for identical or near-identical questions
+        self.answer_cache = AnswerCache(config.ANSWER_CACHE_SIZE, config.ANSWER_CACHE_SIMILARITY)
         
-        # Define the summarization prompt template
-        self.summary_template = PromptTemplate(
-            input_variables=["document_content"],
-            template="""You are a helpful research assistant. Please provide a concise summary of the following document. 
-Focus on the main topics, key findings, and important concepts. The summary should be informative and highlight the most 
-important aspects of the document.
-
-Document:
-{document_content}
-
-Summary:"""
-        )
+        # Fixed parts of the user messages; prompts are built by plain concatenation
+        self.rag_prefix = "Context:\n"
+        self.summary_prefix = "Document:\n"
+    
+    def build_rag_prompt(self, context: str, question: str) -> str:
+        """Build the RAG user message (follows RAG_SYSTEM_PROMPT)"""
+        return self.rag_prefix + context + "\n\nQuestion: " + question + "\n\nAnswer:"
+    
+    def build_summary_prompt(self, document_content: str) -> str:
+        """Build the summarization user message (follows a summary system prompt)"""
+        return self.summary_prefix + document_content + "\n\nSummary:"
     
     def format_context(self, retrieved_docs: List[Dict]) -> Tuple[str, List[Dict]]:
         """Format retrieved documents into context string and citation info"""
         context_parts = []
         citations = []
         
-        for i, doc in enumerate(retrieved_docs):
+        # Skip repeated chunks and near-duplicates (same opening text), keeping rank order
+        seen_ids = set()
+        seen_prefixes = set()
+        
+        for doc in retrieved_docs:
+            prefix_hash = hashlib.blake2b(doc["text"][:200].encode(), digest_size=8).digest()
+            if doc["id"] in seen_ids or prefix_hash in seen_prefixes:
+                continue
+            seen_ids.add(doc["id"])
+            seen_prefixes.add(prefix_hash)
+            
             # Extract metadata
             metadata = doc["metadata"]
             title = metadata.get("title", metadata.get("filename", "Unknown"))
             page = metadata.get("page", "unknown")
             
             # Format document text with citation marker
-            doc_text = f"[Document {i+1}: {title}, Page: {page}]\n{doc['text']}\n"
+            doc_text = f"[Document {len(context_parts) + 1}: {title}, Page: {page}]\n{doc['text']}\n"
             context_parts.append(doc_text)
             
             # Add to citations
@@ -68,15 +94,16 @@ Summary:"""
         
         return "\n\n".join(context_parts), citations
     
-    def query_local_llm(self, prompt: str, model: str = None) -> str:
-        """Query a local LLM using Ollama"""
+    async def aquery_local_llm(self, prompt: str, model: str = None, system: str = "") -> str:
+        """Query a local LLM using Ollama without blocking the event loop"""
         if model is None:
             model = config.DEFAULT_LLM_MODEL
         
         try:
-            response = ollama.generate(
+            response = await self.async_ollama.generate(
                 model=model,
                 prompt=prompt,
+                system=system,
                 options={
                     "temperature": 0.7,
                     "top_p": 0.9,
@@ -88,8 +115,15 @@ Summary:"""
             print(f"Error querying local LLM: {str(e)}")
             return f"Error: Could not generate response from local LLM. {str(e)}"
     
-    def query_openai(self, prompt: str) -> str:
-        """Query OpenAI API for LLM response"""
+    @staticmethod
+    def build_messages(prompt: str, system: str = "") -> List[Dict[str, str]]:
+        """Chat messages with the static system prompt first, so the shared prefix can be cached"""
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        return messages
+    
+    async def aquery_openai(self, prompt: str, system: str = "") -> str:
+        """Query OpenAI API for LLM response over the shared async HTTP/2 client"""
         if not config.OPENAI_API_KEY:
             return "Error: OpenAI API key not configured."
         
@@ -101,32 +135,112 @@ Summary:"""
             
             data = {
                 "model": "gpt-4",
-                "messages": [{"role": "user", "content": prompt}],
+                "messages": self.build_messages(prompt, system),
                 "temperature": 0.7,
                 "max_tokens": 1024
             }
             
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                data=json.dumps(data)
-            )
+            response = await async_http_client.post(OPENAI_CHAT_URL, headers=headers, content=orjson.dumps(data))
             
             if response.status_code == 200:
-                return response.json()["choices"][0]["message"]["content"]
+                return orjson.loads(response.content)["choices"][0]["message"]["content"]
             else:
                 return f"Error: OpenAI API returned status code {response.status_code}. {response.text}"
         except Exception as e:
             print(f"Error querying OpenAI: {str(e)}")
             return f"Error: Could not generate response from OpenAI. {str(e)}"
     
-    def answer_question(self, question: str, top_k: int = None) -> Dict[str, Any]:
-        """Answer a question using RAG approach"""
+    async def astream_local_llm(self, prompt: str, model: str = None, system: str = "") -> AsyncIterator[str]:
+        """Stream a local LLM response from Ollama piece by piece"""
+        if model is None:
+            model = config.DEFAULT_LLM_MODEL
+        
+        try:
+            parts = await self.async_ollama.generate(
+                model=model,
+                prompt=prompt,
+                system=system,
+                stream=True,
+                options={
+                    "temperature": 0.7,
+                    "top_p": 0.9,
+                    "max_tokens": 1024
+                }
+            )
+            async for part in parts:
+                yield part["response"]
+        except Exception as e:
+            print(f"Error querying local LLM: {str(e)}")
+            raise LLMStreamError(f"Error: Could not generate response from local LLM. {str(e)}") from e
+    
+    async def astream_openai(self, prompt: str, system: str = "") -> AsyncIterator[str]:
+        """Stream an OpenAI response piece by piece from its server-sent events"""
+        if not config.OPENAI_API_KEY:
+            raise LLMStreamError("Error: OpenAI API key not configured.")
+        
+        try:
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {config.OPENAI_API_KEY}"
+            }
+            
+            data = {
+                "model": "gpt-4",
+                "messages": self.build_messages(prompt, system),
+                "temperature": 0.7,
+                "max_tokens": 1024,
+                "stream": True
+            }
+            
+            async with async_http_client.stream("POST", OPENAI_CHAT_URL, headers=headers, content=orjson.dumps(data)) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    raise LLMStreamError(f"Error: OpenAI API returned status code {response.status_code}. {body.decode()}")
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    payload = line[len("data: "):]
+                    if payload == "[DONE]":
+                        break
+                    delta = orjson.loads(payload)["choices"][0]["delta"].get("content")
+                    if delta:
+                        yield delta
+        except LLMStreamError:
+            raise
+        except Exception as e:
+            print(f"Error querying OpenAI: {str(e)}")
+            raise LLMStreamError(f"Error: Could not generate response from OpenAI. {str(e)}") from e
+    
+    async def aquery_llm(self, prompt: str, system: str = "") -> str:
+        """Query the configured LLM asynchronously"""
+        if config.USE_LOCAL_LLM:
+            return await self.aquery_local_llm(prompt, system=system)
+        return await self.aquery_openai(prompt, system=system)
+    
+    def get_cached_answer(self, question: str, top_k: int) -> Tuple[Optional[Dict[str, Any]], Tuple[str, int], np.ndarray]:
+        """Look up a cached answer; also returns the cache key and question embedding for storing a new one"""
+        self.answer_cache.invalidate_if_stale(self.embedding_store.version)
+        key = AnswerCache.make_key(question, top_k)
+        # The query embedding is cached by the store, so search() reuses it
+        embedding = self.embedding_store.embed_query(question)
+        return self.answer_cache.get(key, embedding), key, embedding
+    
+    def cache_answer(self, key: Tuple[str, int], embedding: np.ndarray, result: Dict[str, Any]) -> None:
+        """Cache an answer unless generating it failed"""
+        if config.ANSWER_CACHE_SIZE > 0 and not result["answer"].startswith("Error:"):
+            self.answer_cache.put(key, embedding, result)
+    
+    async def aanswer_question(self, question: str, top_k: int = None) -> Dict[str, Any]:
+        """Answer a question using RAG approach, awaiting the LLM instead of blocking a thread"""
         if top_k is None:
             top_k = config.MAX_DOCS_TO_RETRIEVE
         
-        # Retrieve relevant documents
-        retrieved_docs = self.embedding_store.search(question, top_k=top_k)
+        cached, cache_key, embedding = await asyncio.to_thread(self.get_cached_answer, question, top_k)
+        if cached is not None:
+            return cached
+        
+        # Retrieval is CPU-bound, so it runs in a worker thread
+        retrieved_docs = await asyncio.to_thread(self.embedding_store.search, question, top_k)
         
         if not retrieved_docs:
             return {
@@ -138,31 +252,79 @@ Summary:"""
         # Format context and get citations
         context, citations = self.format_context(retrieved_docs)
         
-        # Generate prompt
-        prompt = self.rag_template.format(context=context, question=question)
+        # Generate prompt and get LLM response
+        prompt = self.build_rag_prompt(context, question)
+        answer = await self.aquery_llm(prompt, system=RAG_SYSTEM_PROMPT)
         
-        # Get LLM response
+        result = {
+            "answer": answer,
+            "citations": citations,
+            "retrieved_docs": retrieved_docs if config.SHOW_CITATIONS else []
+        }
+        self.cache_answer(cache_key, embedding, result)
+        return result
+    
+    async def aanswer_question_stream(self, question: str, top_k: int = None) -> AsyncIterator[Dict[str, Any]]:
+        """Answer a question using RAG approach, yielding {"delta"} events as the answer is generated
+        and a final {"done", "error", "answer", "citations", "retrieved_docs"} event"""
+        if top_k is None:
+            top_k = config.MAX_DOCS_TO_RETRIEVE
+        
+        cached, cache_key, embedding = await asyncio.to_thread(self.get_cached_answer, question, top_k)
+        if cached is not None:
+            yield {"delta": cached["answer"]}
+            yield {"done": True, "error": False, **cached}
+            return
+        
+        # Retrieval is CPU-bound, so it runs in a worker thread
+        retrieved_docs = await asyncio.to_thread(self.embedding_store.search, question, top_k)
+        
+        if not retrieved_docs:
+            answer = "I don't have enough information to answer this question. Please upload relevant documents first."
+            yield {"delta": answer}
+            yield {"done": True, "error": False, "answer": answer, "citations": [], "retrieved_docs": []}
+            return
+        
+        # Format context and get citations
+        context, citations = self.format_context(retrieved_docs)
+        
+        # Generate prompt and stream the LLM response
+        prompt = self.build_rag_prompt(context, question)
         if config.USE_LOCAL_LLM:
-            answer = self.query_local_llm(prompt)
+            stream = self.astream_local_llm(prompt, system=RAG_SYSTEM_PROMPT)
         else:
-            answer = self.query_openai(prompt)
+            stream = self.astream_openai(prompt, system=RAG_SYSTEM_PROMPT)
         
-        return {
-            "answer": answer,
+        parts = []
+        failed = False
+        try:
+            async for delta in stream:
+                parts.append(delta)
+                yield {"delta": delta}
+        except LLMStreamError as e:
+            # Show the error after whatever part of the answer arrived before the failure
+            failed = True
+            delta = f"\n\n{e}" if parts else str(e)
+            parts.append(delta)
+            yield {"delta": delta}
+        
+        result = {
+            "answer": "".join(parts),
             "citations": citations,
             "retrieved_docs": retrieved_docs if config.SHOW_CITATIONS else []
         }
+        # After a mid-stream failure the answer no longer starts with "Error:", so skip caching here
+        if not failed:
+            self.cache_answer(cache_key, embedding, result)
+        yield {"done": True, "error": failed, **result}
     
-    def summarize_document(self, document_id: str = None, filename: str = None) -> Dict[str, Any]:
-        """Generate a summary for a document"""
+    async def asummarize_document(self, document_id: str = None, filename: str = None) -> Dict[str, Any]:
+        """Generate a summary for a document, awaiting the LLM instead of blocking a thread"""
         # Get all chunks for the document
         if document_id:
-            # In a real implementation, we would query the database for all chunks with this document_id
-            # For now, we'll use a mock approach
-            document_chunks = self.embedding_store.get_document_chunks(document_id)
+            document_chunks = await asyncio.to_thread(self.embedding_store.get_document_chunks, document_id)
         elif filename:
-            # Get chunks by filename
-            document_chunks = self.embedding_store.get_document_chunks_by_filename(filename)
+            document_chunks = await asyncio.to_thread(self.embedding_store.get_document_chunks_by_filename, filename)
         else:
             return {
                 "summary": "Error: No document ID or filename provided.",
@@ -177,21 +339,29 @@ Summary:"""
                 "title": filename
             }
         
-        # Concatenate all chunks
-        document_content = "\n\n".join([chunk["text"] for chunk in document_chunks])
+        # Map: summarize groups of chunks concurrently (bounded by SUMMARY_CONCURRENCY)
+        group_size = max(1, config.SUMMARY_GROUP_SIZE)
+        groups = [document_chunks[i:i + group_size] for i in range(0, len(document_chunks), group_size)]
+        if len(groups) > 1:
+            semaphore = asyncio.Semaphore(max(1, config.SUMMARY_CONCURRENCY))
+            
+            async def summarize_section(group: List[Dict]) -> str:
+                prompt = self.build_summary_prompt("\n\n".join(chunk["text"] for chunk in group))
+                async with semaphore:
+                    return await self.aquery_llm(prompt, system=SECTION_SUMMARY_SYSTEM_PROMPT)
+            
+            section_summaries = await asyncio.gather(*[summarize_section(group) for group in groups])
+            document_content = "\n\n".join(section_summaries)
+        else:
+            document_content = "\n\n".join([chunk["text"] for chunk in document_chunks])
         
         # Get metadata from the first chunk
         metadata = document_chunks[0]["metadata"]
         title = metadata.get("title", metadata.get("filename", "Unknown"))
         
-        # Generate prompt
-        prompt = self.summary_template.format(document_content=document_content)
-        
-        # Get LLM response
-        if config.USE_LOCAL_LLM:
-            summary = self.query_local_llm(prompt)
-        else:
-            summary = self.query_openai(prompt)
+        # Reduce: one final summary over the section summaries (or the whole text of short documents)
+        prompt = self.build_summary_prompt(document_content)
+        summary = await self.aquery_llm(prompt, system=SUMMARY_SYSTEM_PROMPT)
         
         return {
             "summary": summary,
@@ -212,7 +382,7 @@ if __name__ == "__main__":
     
     # Test with a sample question
     if store.get_document_count() > 0:
-        result = handler.answer_question("What is machine learning?")
+        result = asyncio.run(handler.aanswer_question("What is machine learning?"))
         print(f"Answer: {result['answer']}")
         print(f"Citations: {len(result['citations'])}")
     else:
@@ -1,10 +1,20 @@
 import os
 import sys
+import asyncio
+import uuid
+import sqlite3
 import requests
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder
 import json
 import time
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
+import aiohttp
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
 
 # Add parent directory to path to import config
@@ -15,16 +25,36 @@ try:
     CHUNK_SIZE = config.CHUNK_SIZE
     CHUNK_OVERLAP = config.CHUNK_OVERLAP
     MAX_DOCS_TO_RETRIEVE = config.MAX_DOCS_TO_RETRIEVE
+    MODELS_DIR = config.MODELS_DIR
 except (ImportError, AttributeError):
     # Fallback to hardcoded values if import fails
     API_PORT = 8002
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
     MAX_DOCS_TO_RETRIEVE = 5
+    MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+
+# Question history: the latest entries stay in session state, their retrieved passages in SQLite
+HISTORY_SIZE = 50
+HISTORY_DB_PATH = os.path.join(MODELS_DIR, "question_history.sqlite")
+# Passages of ended sessions are never read again; rows older than this are pruned on startup
+HISTORY_MAX_AGE = 7 * 24 * 3600
+
+# Answers kept for repeated questions, shared across reruns and sessions
+ANSWER_CACHE_SIZE = 256
 
 # API endpoint
 API_URL = f"http://localhost:{API_PORT}"
 
+# One pooled session for every API call, so reruns reuse keep-alive connections
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
+# (connect, read) timeouts: short for bookkeeping calls, long for uploads and LLM calls
+API_TIMEOUT = (3, 30)
+LLM_TIMEOUT = (3, 300)
+
 # Page configuration
 st.set_page_config(
     page_title="PDF Research Assistant",
@@ -33,147 +63,16 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS
-st.markdown("""
-<style>
-    .main {
-        padding: 2rem;
-    }
-    .stApp {
-        max-width: 1200px;
-        margin: 0 auto;
-    }
-    .citation {
-        background-color: #f0f2f6;
-        border-radius: 8px;
-        padding: 15px;
-        margin-bottom: 15px;
-        border-left: 4px solid #4CAF50;
-        box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-    }
-    .source-text {
-        font-size: 0.9rem;
-        border-left: 3px solid #4CAF50;
-        padding-left: 15px;
-        margin-top: 10px;
-        background-color: #f9f9f9;
-        padding: 10px;
-        border-radius: 5px;
-    }
-    .answer-box {
-        background-color: #f8f9fa;
-        border-radius: 10px;
-        padding: 25px;
-        margin-bottom: 25px;
-        border: 1px solid #e0e0e0;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.05);
-    }
-    .upload-section {
-        background-color: #f0f7ff;
-        padding: 20px;
-        border-radius: 10px;
-        margin-bottom: 20px;
-        border: 1px solid #d0e1f9;
-    }
-    .stButton>button {
-        background-color: #4CAF50;
-        color: white;
-        border-radius: 5px;
-        border: none;
-        padding: 10px 24px;
-        font-weight: bold;
-        white-space: nowrap;
-        min-width: 80px;
-    }
-    .stButton>button:hover {
-        background-color: #45a049;
-    }
-    h1, h2, h3, h4, h5, h6 {
-        color: white !important;
-    }
-    .feature-box {
-        background-color: #e8f4fd;
-        border-radius: 8px;
-        padding: 15px;
-        margin-bottom: 15px;
-        border-left: 4px solid #3498db;
-    }
-    .summary-box {
-        background-color: #fff8e1;
-        border-radius: 8px;
-        padding: 15px;
-        margin-bottom: 15px;
-        border-left: 4px solid #ffc107;
-    }
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 10px;
-    }
-    .stTabs [data-baseweb="tab"] {
-        background-color: #f0f2f6;
-        border-radius: 4px 4px 0 0;
-        padding: 10px 20px;
-        border: none;
-        color: black !important;
-        font-weight: bold !important;
-    }
-    .stTabs [aria-selected="true"] {
-        background-color: #4CAF50 !important;
-        color: white !important;
-    }
-    .header-container {
-        display: flex;
-        align-items: center;
-        margin-bottom: 1rem;
-    }
-    .header-logo {
-        font-size: 2.5rem;
-        margin-right: 0.5rem;
-    }
-    .header-title {
-        font-size: 2rem;
-        font-weight: bold;
-        margin: 0;
-    }
-    .header-subtitle {
-        font-size: 1rem;
-        color: #666;
-        margin-top: 0.5rem;
-    }
-    /* Fix for sidebar headers */
-    .sidebar .block-container h1, 
-    .sidebar .block-container h2, 
-    .sidebar .block-container h3, 
-    .sidebar .block-container h4 {
-        color: white !important;
-    }
-    /* Fix for question text area */
-    .stTextArea textarea {
-        color: #666 !important;
-    }
-    /* Make tab content text visible */
-    .stTabs [role="tabpanel"] {
-        color: white !important;
-    }
-    /* Make all text in Document Management, Summaries, and Settings tabs visible */
-    .stTabs [role="tabpanel"] p,
-    .stTabs [role="tabpanel"] span,
-    .stTabs [role="tabpanel"] div,
-    .stTabs [role="tabpanel"] label {
-        color: white !important;
-    }
-    /* Make dataframe text black for better visibility */
-    .stDataFrame {
-        color: black !important;
-    }
-    .stDataFrame th {
-        color: black !important;
-        font-weight: bold !important;
-    }
-    .stDataFrame td {
-        color: black !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Custom CSS, read from disk once per server process
+STYLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "style.css")
+
+@st.cache_resource
+def load_css():
+    """Read the custom stylesheet once and wrap it in a <style> tag"""
+    with open(STYLE_PATH, encoding="utf-8") as f:
+        return f"<style>{f.read()}</style>"
+
+st.markdown(load_css(), unsafe_allow_html=True)
 
 # Session state initialization
 if "document_count" not in st.session_state:
@@ -181,40 +80,120 @@ if "document_count" not in st.session_state:
 if "processing" not in st.session_state:
     st.session_state.processing = False
 if "question_history" not in st.session_state:
-    st.session_state.question_history = []
+    st.session_state.question_history = deque(maxlen=HISTORY_SIZE)
 if "active_tab" not in st.session_state:
     st.session_state.active_tab = "Ask"
 if "summaries" not in st.session_state:
     st.session_state.summaries = {}
 if "documents" not in st.session_state:
     st.session_state.documents = []
+if "doc_names" not in st.session_state:
+    st.session_state.doc_names = ()
 if "chunk_size" not in st.session_state:
     st.session_state.chunk_size = CHUNK_SIZE
 if "chunk_overlap" not in st.session_state:
     st.session_state.chunk_overlap = CHUNK_OVERLAP
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Helper functions
-def check_api_status():
-    """Check if the API is running and get document count"""
+def session_headers():
+    """Headers identifying this browser session to the API (SESSION itself is shared by all users)"""
+    return {"X-Session-Id": st.session_state.session_id}
+
+@st.cache_resource
+def get_history_db():
+    """Open the SQLite store holding the retrieved passages of past questions"""
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    conn = sqlite3.connect(HISTORY_DB_PATH, check_same_thread=False)
+    conn.execute("CREATE TABLE IF NOT EXISTS retrieved_docs (id TEXT PRIMARY KEY, docs TEXT NOT NULL, created REAL NOT NULL DEFAULT 0)")
+    # Stores written before rows were timestamped; their rows count as expired
+    if "created" not in {row[1] for row in conn.execute("PRAGMA table_info(retrieved_docs)")}:
+        conn.execute("ALTER TABLE retrieved_docs ADD COLUMN created REAL NOT NULL DEFAULT 0")
+    conn.execute("DELETE FROM retrieved_docs WHERE created < ?", (time.time() - HISTORY_MAX_AGE,))
+    conn.commit()
+    return conn
+
+def add_to_history(question, result):
+    """Add an answered question to the history, keeping its retrieved passages out of session state"""
+    docs_id = uuid.uuid4().hex
+    history = st.session_state.question_history
+    conn = get_history_db()
+    if len(history) == history.maxlen:
+        # The oldest entry is evicted by the append below, so its passages are never read again
+        conn.execute("DELETE FROM retrieved_docs WHERE id = ?", (history[0]["docs_id"],))
+    conn.execute(
+        "INSERT INTO retrieved_docs (id, docs, created) VALUES (?, ?, ?)",
+        (docs_id, json.dumps(result["retrieved_docs"]), time.time())
+    )
+    conn.commit()
+    
+    history.append({
+        "question": question,
+        "answer": result["answer"],
+        "citations": result["citations"],
+        "docs_id": docs_id
+    })
+
+def load_history_result(item):
+    """Rebuild a full result from a history entry, loading its retrieved passages from SQLite"""
+    row = get_history_db().execute("SELECT docs FROM retrieved_docs WHERE id = ?", (item["docs_id"],)).fetchone()
+    return {
+        "answer": item["answer"],
+        "citations": item["citations"],
+        "retrieved_docs": json.loads(row[0]) if row else []
+    }
+
+# Read-only fetchers, memoized briefly so widget reruns don't each hit the API.
+# They never touch session state; their callers do.
+@st.cache_data(ttl=5, show_spinner=False)
+def _fetch_status():
+    """Get the document count from the API (None if the API is not reachable)"""
     try:
-        response = requests.get(f"{API_URL}/status")
+        response = SESSION.get(f"{API_URL}/status", timeout=API_TIMEOUT)
         if response.status_code == 200:
-            data = response.json()
-            st.session_state.document_count = data["document_count"]
-            return True
-        return False
+            return response.json()["document_count"]
+        return None
     except:
+        return None
+
+@st.cache_data(ttl=5, show_spinner=False)
+def _fetch_documents():
+    """Get the document list from the API (errors propagate and are not cached)"""
+    response = SESSION.get(f"{API_URL}/documents", timeout=API_TIMEOUT)
+    if response.status_code == 200:
+        return response.json()["documents"]
+    return []
+
+def clear_api_cache():
+    """Forget memoized API reads after a change to the documents"""
+    _fetch_status.clear()
+    _fetch_documents.clear()
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _documents_dataframe(document_rows):
+    """Build the documents table; keyed on the document list as hashable (field, value) tuples"""
+    return pd.DataFrame([dict(row) for row in document_rows])
+
+def check_api_status():
+    """Check if the API is running and get document count"""
+    document_count = _fetch_status()
+    if document_count is None:
         return False
+    st.session_state.document_count = document_count
+    return True
+
+def set_documents(documents):
+    """Store the document list along with its filenames, so reruns don't rebuild the name list"""
+    st.session_state.documents = documents
+    st.session_state.doc_names = tuple(doc["filename"] for doc in documents)
 
 def get_documents():
     """Get list of documents from the API"""
     try:
-        response = requests.get(f"{API_URL}/documents")
-        if response.status_code == 200:
-            data = response.json()
-            st.session_state.documents = data["documents"]
-            return data["documents"]
-        return []
+        documents = _fetch_documents()
+        set_documents(documents)
+        return documents
     except Exception as e:
         st.error(f"Error getting documents: {str(e)}")
         return []
@@ -222,9 +201,10 @@ def get_documents():
 def delete_document(filename):
     """Delete a document from the API"""
     try:
-        response = requests.delete(f"{API_URL}/documents/{filename}")
+        response = SESSION.delete(f"{API_URL}/documents/{filename}", timeout=API_TIMEOUT)
         if response.status_code == 200:
             # Refresh document list
+            clear_api_cache()
             get_documents()
             return True
         return False
@@ -239,26 +219,32 @@ def upload_pdfs(files, use_pdfplumber, chunk_size=None, chunk_overlap=None):
     
     try:
         # Create form data
-        form_data = {"use_pdfplumber": str(use_pdfplumber).lower()}
+        fields = [("use_pdfplumber", str(use_pdfplumber).lower())]
         
         # Add chunking parameters if provided
         if chunk_size:
-            form_data["chunk_size"] = str(chunk_size)
+            fields.append(("chunk_size", str(chunk_size)))
         if chunk_overlap:
-            form_data["chunk_overlap"] = str(chunk_overlap)
+            fields.append(("chunk_overlap", str(chunk_overlap)))
         
-        files_data = [("files", (file.name, file.getvalue(), "application/pdf")) for file in files]
+        # Stream the uploaded file objects into the request body instead of copying their bytes first
+        for file in files:
+            file.seek(0)
+            fields.append(("files", (file.name, file, "application/pdf")))
+        encoder = MultipartEncoder(fields=fields)
         
         # Upload files
-        response = requests.post(
+        response = SESSION.post(
             f"{API_URL}/upload-pdfs",
-            data=form_data,
-            files=files_data
+            data=encoder,
+            headers={"Content-Type": encoder.content_type},
+            timeout=LLM_TIMEOUT
         )
         
         if response.status_code == 200:
             data = response.json()
             st.session_state.processing = True
+            clear_api_cache()
             return data
         else:
             st.error(f"Error uploading files: {response.text}")
@@ -267,36 +253,170 @@ def upload_pdfs(files, use_pdfplumber, chunk_size=None, chunk_overlap=None):
         st.error(f"Error: {str(e)}")
         return None
 
-def ask_question(question, top_k=None):
-    """Ask a question to the API"""
+async def _upload_one(session, file, use_pdfplumber, chunk_size=None, chunk_overlap=None):
+    """Upload a single PDF; returns (filename, status code, response body)"""
+    form = aiohttp.FormData()
+    form.add_field("use_pdfplumber", str(use_pdfplumber).lower())
+    if chunk_size:
+        form.add_field("chunk_size", str(chunk_size))
+    if chunk_overlap:
+        form.add_field("chunk_overlap", str(chunk_overlap))
+    file.seek(0)
+    form.add_field("files", file, filename=file.name, content_type="application/pdf")
+    
+    async with session.post(f"{API_URL}/upload-pdfs", data=form) as response:
+        return file.name, response.status, await response.text()
+
+async def _upload_all(files, use_pdfplumber, chunk_size=None, chunk_overlap=None):
+    """Upload PDFs concurrently over one aiohttp session"""
+    timeout = aiohttp.ClientTimeout(sock_connect=LLM_TIMEOUT[0], sock_read=LLM_TIMEOUT[1])
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        return await asyncio.gather(
+            *[_upload_one(session, file, use_pdfplumber, chunk_size, chunk_overlap) for file in files],
+            return_exceptions=True
+        )
+
+def upload_pdfs_parallel(files, use_pdfplumber, chunk_size=None, chunk_overlap=None):
+    """Upload PDFs to the API as one request per file, sent concurrently"""
+    if not files:
+        return
+    
+    results = asyncio.run(_upload_all(files, use_pdfplumber, chunk_size, chunk_overlap))
+    
+    data = None
+    for file, result in zip(files, results):
+        if isinstance(result, Exception):
+            st.error(f"Error uploading {file.name}: {str(result)}")
+        elif result[1] != 200:
+            st.error(f"Error uploading {result[0]}: {result[2]}")
+        else:
+            data = json.loads(result[2])
+    
+    if data is not None:
+        st.session_state.processing = True
+        clear_api_cache()
+    return data
+
+@st.cache_resource
+def get_answer_cache():
+    """LRU of answers keyed by (question, top_k, document fingerprint), with a lock for concurrent sessions"""
+    return OrderedDict(), threading.Lock()
+
+def answer_cache_key(question, top_k):
+    """Key an answer by the normalized question, top_k and the current set of documents"""
+    documents_fingerprint = hash((st.session_state.document_count, st.session_state.doc_names))
+    return " ".join(question.lower().split()), top_k, documents_fingerprint
+
+def get_cached_answer(key):
+    """Get a cached answer (None if not cached)"""
+    entries, lock = get_answer_cache()
+    with lock:
+        if key not in entries:
+            return None
+        entries.move_to_end(key)
+        return entries[key]
+
+def cache_answer(key, result):
+    """Cache an answer unless generating it failed"""
+    if result["answer"].startswith("Error:"):
+        return
+    entries, lock = get_answer_cache()
+    with lock:
+        entries[key] = result
+        entries.move_to_end(key)
+        while len(entries) > ANSWER_CACHE_SIZE:
+            entries.popitem(last=False)
+
+async def _ask_one(session, question, top_k=None):
+    """Ask a single question; returns (status code, response body)"""
+    payload = {"question": question}
+    if top_k:
+        payload["top_k"] = top_k
+    
+    async with session.post(f"{API_URL}/ask", json=payload) as response:
+        return response.status, await response.text()
+
+async def _ask_all(questions, top_k=None, headers=None):
+    """Ask questions concurrently over one aiohttp session"""
+    timeout = aiohttp.ClientTimeout(sock_connect=LLM_TIMEOUT[0], sock_read=LLM_TIMEOUT[1])
+    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
+        return await asyncio.gather(
+            *[_ask_one(session, question, top_k) for question in questions],
+            return_exceptions=True
+        )
+
+def rerun_history(top_k=None):
+    """Ask every question in the history again, concurrently, and refresh the stored answers"""
+    items = list(st.session_state.question_history)
+    questions = list(dict.fromkeys(item["question"] for item in items))
+    results = dict(zip(questions, asyncio.run(_ask_all(questions, top_k, session_headers()))))
+    
+    conn = get_history_db()
+    refreshed = 0
+    for item in items:
+        result = results[item["question"]]
+        if isinstance(result, Exception):
+            st.error(f"Error re-running '{item['question'][:30]}': {str(result)}")
+            continue
+        if result[0] != 200:
+            st.error(f"Error re-running '{item['question'][:30]}': {result[1]}")
+            continue
+        
+        data = json.loads(result[1])
+        cache_answer(answer_cache_key(item["question"], top_k), data)
+        item["answer"] = data["answer"]
+        item["citations"] = data["citations"]
+        conn.execute("UPDATE retrieved_docs SET docs = ? WHERE id = ?", (json.dumps(data["retrieved_docs"]), item["docs_id"]))
+        refreshed += 1
+    conn.commit()
+    return refreshed
+
+def ask_question_stream(question, top_k=None):
+    """Ask a question to the API and yield the answer as it is generated.
+    
+    The final result is stored in st.session_state.current_result once the stream ends.
+    """
+    key = answer_cache_key(question, top_k)
+    cached = get_cached_answer(key)
+    if cached is not None:
+        add_to_history(question, cached)
+        st.session_state.current_result = cached
+        yield cached["answer"]
+        return
+    
     try:
         payload = {"question": question}
         if top_k:
             payload["top_k"] = top_k
         
-        response = requests.post(
-            f"{API_URL}/ask",
-            json=payload
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            
-            # Add to question history
-            st.session_state.question_history.append({
-                "question": question,
-                "answer": result["answer"],
-                "citations": result["citations"],
-                "retrieved_docs": result["retrieved_docs"]
-            })
+        with SESSION.post(f"{API_URL}/ask/stream", json=payload, headers=session_headers(),
+                          stream=True, timeout=LLM_TIMEOUT) as response:
+            if response.status_code != 200:
+                st.error(f"Error: {response.text}")
+                return
             
-            return result
-        else:
-            st.error(f"Error: {response.text}")
-            return None
+            # Newline-delimited JSON: one event object per line
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("done"):
+                    result = {
+                        "answer": event["answer"],
+                        "citations": event["citations"],
+                        "retrieved_docs": event["retrieved_docs"]
+                    }
+                    # An answer cut short by an LLM failure can't be recognized by its text alone
+                    if not event.get("error"):
+                        cache_answer(key, result)
+                    
+                    # Add to question history
+                    add_to_history(question, result)
+                    st.session_state.current_result = result
+                else:
+                    yield event["delta"]
     except Exception as e:
         st.error(f"Error: {str(e)}")
-        return None
 
 def generate_document_summary(filename):
     """Generate a summary for a document"""
@@ -307,9 +427,10 @@ def generate_document_summary(filename):
         
         # Request summary from API
         payload = {"filename": filename}
-        response = requests.post(
+        response = SESSION.post(
             f"{API_URL}/summarize",
-            json=payload
+            json=payload,
+            timeout=LLM_TIMEOUT
         )
         
         if response.status_code == 200:
@@ -332,9 +453,10 @@ def update_chunking_config(chunk_size, chunk_overlap):
             "chunk_overlap": chunk_overlap
         }
         
-        response = requests.post(
+        response = SESSION.post(
             f"{API_URL}/chunking-config",
-            json=payload
+            json=payload,
+            timeout=API_TIMEOUT
         )
         
         if response.status_code == 200:
@@ -348,6 +470,116 @@ def update_chunking_config(chunk_size, chunk_overlap):
         st.error(f"Error: {str(e)}")
         return False
 
+# Page sections that rerun on their own when their widgets change
+@st.fragment
+def render_ask_tab(top_k):
+    """Question input, answer and retrieved passages; the answer streams within this fragment and
+    the whole page reruns only once it has been added to the sidebar's history"""
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        # Question input
+        st.subheader("Ask a Question")
+        question = st.text_area("Enter your question about the documents", height=100, 
+                                placeholder="e.g., What are the main types of machine learning?")
+        
+        col_btn1, col_btn2 = st.columns([1, 5])
+        with col_btn1:
+            ask_clicked = st.button("Ask", key="ask_btn", use_container_width=True)
+        
+        if ask_clicked:
+            if question:
+                history = st.session_state.question_history
+                latest = history[-1] if history else None
+                
+                # Render tokens as they arrive; the full answer with sources is shown below once done
+                stream_placeholder = st.empty()
+                with stream_placeholder.container():
+                    st.markdown("### 💡 Answer")
+                    st.write_stream(ask_question_stream(question, top_k))
+                stream_placeholder.empty()
+                
+                # The sidebar's Question History is outside this fragment
+                if history and history[-1] is not latest:
+                    st.rerun()
+            else:
+                st.warning("Please enter a question")
+        
+        # Display answer
+        if "current_result" in st.session_state:
+            result = st.session_state.current_result
+            
+            st.markdown("### 💡 Answer")
+            st.markdown(f"<div class='answer-box'>{result['answer']}</div>", unsafe_allow_html=True)
+            
+            # Display citations, sent to the browser as one element
+            if result["citations"]:
+                st.markdown("### 📚 Sources")
+                st.markdown(
+                    "".join(
+                        f"<div class='citation'>"
+                        f"<strong>Document:</strong> {citation['title']} | "
+                        f"<strong>Page:</strong> {citation['page']} | "
+                        f"<strong>Relevance:</strong> {citation['score']:.2f}"
+                        f"</div>"
+                        for citation in result["citations"]
+                    ),
+                    unsafe_allow_html=True
+                )
+    
+    with col2:
+        # Display retrieved documents
+        if "current_result" in st.session_state and st.session_state.current_result["retrieved_docs"]:
+            st.markdown("### 📄 Retrieved Passages")
+            docs = st.session_state.current_result["retrieved_docs"]
+            
+            for i, doc in enumerate(docs):
+                with st.expander(f"Passage {i+1} - {doc['metadata']['filename']} (Page {doc['metadata']['page']})"):
+                    st.markdown(
+                        f"<div class='source-text'>{doc['text']}</div>"
+                        f"<small>Relevance Score: {doc['score']:.2f}</small>",
+                        unsafe_allow_html=True
+                    )
+
+@st.fragment
+def render_document_table():
+    """Document table and per-document actions; selecting a document only reruns this fragment,
+    actions that change what the rest of the page shows rerun the whole page"""
+    # Create a dataframe from the document list
+    doc_df = _documents_dataframe(tuple(tuple(doc.items()) for doc in st.session_state.documents))
+    
+    # Add a selection column
+    if not doc_df.empty:
+        # Display as a table
+        st.dataframe(doc_df, use_container_width=True)
+        
+        # Document actions
+        selected_doc = st.selectbox("Select a document for actions:", 
+                                   st.session_state.doc_names)
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if st.button("Delete Document", key="delete_btn"):
+                with st.spinner("Deleting document..."):
+                    if delete_document(selected_doc):
+                        # Refresh document count
+                        check_api_status()
+                        # The sidebar's document count and the Summaries tab are outside this
+                        # fragment; the confirmation is shown once the whole page has rerun
+                        st.session_state.deleted_document = selected_doc
+                        st.rerun()
+        with col2:
+            st.button("Download", key="download_btn", disabled=True)
+        with col3:
+            if st.button("Generate Summary", key="summary_btn"):
+                with st.spinner("Generating summary..."):
+                    summary = generate_document_summary(selected_doc)
+                    if summary:
+                        st.session_state.current_summary = summary
+                        st.session_state.active_tab = "Summaries"
+                        # The Summaries tab is outside this fragment
+                        st.rerun()
+
 # Main app
 def main():
     # Header with logo
@@ -361,16 +593,27 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
-    # Check API status
-    api_running = check_api_status()
-    if not api_running:
+    # Check API status and, if not loaded yet, get the document list: the two requests are
+    # independent, so they run concurrently (worker threads share this script run's context)
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=2, initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)) as executor:
+        status_future = executor.submit(_fetch_status)
+        documents_future = executor.submit(_fetch_documents) if not st.session_state.documents else None
+        document_count = status_future.result()
+        try:
+            documents = documents_future.result() if documents_future else None
+        except Exception:
+            documents = None
+    
+    if document_count is None:
         st.error("⚠️ API server is not running. Please start the backend server.")
         st.code("cd backend && uvicorn main:app --reload", language="bash")
         return
+    st.session_state.document_count = document_count
     
     # Get document list
-    if st.session_state.document_count > 0 and not st.session_state.documents:
-        get_documents()
+    if document_count > 0 and documents:
+        set_documents(documents)
     
     # Sidebar
     with st.sidebar:
@@ -391,48 +634,56 @@ def main():
         st.markdown("---")
         st.subheader("📤 Upload Documents")
         
-        uploaded_files = st.file_uploader(
-            "Upload PDF files",
-            type=["pdf"],
-            accept_multiple_files=True
-        )
-        
-        use_pdfplumber = st.checkbox(
-            "Use PDFPlumber (better for complex layouts)",
-            value=False
-        )
-        
-        # Advanced chunking options - moved outside of any expander
-        st.subheader("Advanced Chunking Options")
-        chunk_size = st.slider(
-            "Chunk Size",
-            min_value=100,
-            max_value=2000,
-            value=st.session_state.chunk_size,
-            step=100
-        )
-        
-        chunk_overlap = st.slider(
-            "Chunk Overlap",
-            min_value=0,
-            max_value=500,
-            value=st.session_state.chunk_overlap,
-            step=50
-        )
-        
-        if st.button("Process Documents", key="process_btn"):
-            if uploaded_files:
-                with st.spinner("Uploading files..."):
-                    result = upload_pdfs(
-                        uploaded_files, 
-                        use_pdfplumber,
-                        chunk_size,
-                        chunk_overlap
-                    )
-                    if result:
-                        st.success(f"Processing {len(uploaded_files)} PDFs in the background")
-            else:
-                st.warning("Please upload PDF files first")
+        # A form, so the sliders and checkboxes only rerun the app when the form is submitted
+        with st.form("upload_form"):
+            uploaded_files = st.file_uploader(
+                "Upload PDF files",
+                type=["pdf"],
+                accept_multiple_files=True
+            )
+            
+            use_pdfplumber = st.checkbox(
+                "Use PDFPlumber (better for complex layouts)",
+                value=False
+            )
+            
+            parallel_upload = st.checkbox(
+                "Upload files in parallel (one request per file)",
+                value=False
+            )
+            
+            # Advanced chunking options - moved outside of any expander
+            st.subheader("Advanced Chunking Options")
+            chunk_size = st.slider(
+                "Chunk Size",
+                min_value=100,
+                max_value=2000,
+                value=st.session_state.chunk_size,
+                step=100
+            )
+            
+            chunk_overlap = st.slider(
+                "Chunk Overlap",
+                min_value=0,
+                max_value=500,
+                value=st.session_state.chunk_overlap,
+                step=50
+            )
+            
+            if st.form_submit_button("Process Documents"):
+                if uploaded_files:
+                    with st.spinner("Uploading files..."):
+                        upload = upload_pdfs_parallel if parallel_upload else upload_pdfs
+                        result = upload(
+                            uploaded_files, 
+                            use_pdfplumber,
+                            chunk_size,
+                            chunk_overlap
+                        )
+                        if result:
+                            st.success(f"Processing {len(uploaded_files)} PDFs in the background")
+                else:
+                    st.warning("Please upload PDF files first")
         
         # Search settings
         st.markdown("---")
@@ -454,100 +705,35 @@ def main():
                 if st.button(f"Q: {item['question'][:30]}...", key=f"hist_{i}"):
                     st.session_state.selected_history = i
                     st.session_state.active_tab = "Ask"
+                    st.session_state.current_result = load_history_result(item)
+            
+            if st.button("🔄 Re-run history", key="rerun_history_btn"):
+                with st.spinner("Re-running questions..."):
+                    refreshed = rerun_history(top_k)
+                if refreshed:
+                    st.success(f"Refreshed {refreshed} answers")
     
     # Main content - Tabs
     tabs = st.tabs(["📝 Ask Questions", "📊 Document Management", "📋 Summaries", "⚙️ Settings"])
     
     # Tab 1: Ask Questions
     with tabs[0]:
-        col1, col2 = st.columns([2, 1])
-        
-        with col1:
-            # Question input
-            st.subheader("Ask a Question")
-            question = st.text_area("Enter your question about the documents", height=100, 
-                                    placeholder="e.g., What are the main types of machine learning?")
-            
-            col_btn1, col_btn2 = st.columns([1, 5])
-            with col_btn1:
-                if st.button("Ask", key="ask_btn", use_container_width=True):
-                    if question:
-                        with st.spinner("Generating answer..."):
-                            result = ask_question(question, top_k)
-                            if result:
-                                st.session_state.current_result = result
-                    else:
-                        st.warning("Please enter a question")
-            
-            # Display answer
-            if "current_result" in st.session_state:
-                result = st.session_state.current_result
-                
-                st.markdown("### 💡 Answer")
-                st.markdown(f"<div class='answer-box'>{result['answer']}</div>", unsafe_allow_html=True)
-                
-                # Display citations
-                if result["citations"]:
-                    st.markdown("### 📚 Sources")
-                    for citation in result["citations"]:
-                        st.markdown(
-                            f"<div class='citation'>"
-                            f"<strong>Document:</strong> {citation['title']} | "
-                            f"<strong>Page:</strong> {citation['page']} | "
-                            f"<strong>Relevance:</strong> {citation['score']:.2f}"
-                            f"</div>",
-                            unsafe_allow_html=True
-                        )
-        
-        with col2:
-            # Display retrieved documents
-            if "current_result" in st.session_state and st.session_state.current_result["retrieved_docs"]:
-                st.markdown("### 📄 Retrieved Passages")
-                docs = st.session_state.current_result["retrieved_docs"]
-                
-                for i, doc in enumerate(docs):
-                    with st.expander(f"Passage {i+1} - {doc['metadata']['filename']} (Page {doc['metadata']['page']})"):
-                        st.markdown(f"<div class='source-text'>{doc['text']}</div>", unsafe_allow_html=True)
-                        st.caption(f"Relevance Score: {doc['score']:.2f}")
+        render_ask_tab(top_k)
     
     # Tab 2: Document Management
     with tabs[1]:
         st.markdown("### 📚 Document Management")
         
+        deleted_document = st.session_state.pop("deleted_document", None)
+        if deleted_document:
+            st.success(f"Document {deleted_document} deleted successfully")
+        
         # Document list
         if st.session_state.documents:
             st.markdown("<div class='feature-box'>", unsafe_allow_html=True)
             st.markdown("#### 📁 Your Documents")
             
-            # Create a dataframe from the document list
-            doc_df = pd.DataFrame(st.session_state.documents)
-            
-            # Add a selection column
-            if not doc_df.empty:
-                # Display as a table
-                st.dataframe(doc_df, use_container_width=True)
-                
-                # Document actions
-                selected_doc = st.selectbox("Select a document for actions:", 
-                                           [doc["filename"] for doc in st.session_state.documents])
-                
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    if st.button("Delete Document", key="delete_btn"):
-                        with st.spinner("Deleting document..."):
-                            if delete_document(selected_doc):
-                                st.success(f"Document {selected_doc} deleted successfully")
-                                # Refresh document count
-                                check_api_status()
-                with col2:
-                    st.button("Download", key="download_btn", disabled=True)
-                with col3:
-                    if st.button("Generate Summary", key="summary_btn"):
-                        with st.spinner("Generating summary..."):
-                            summary = generate_document_summary(selected_doc)
-                            if summary:
-                                st.session_state.current_summary = summary
-                                st.session_state.active_tab = "Summaries"
+            render_document_table()
             
             st.markdown("</div>", unsafe_allow_html=True)
         else:
@@ -560,7 +746,7 @@ def main():
         if st.session_state.documents:
             # Document selection for summary
             selected_doc = st.selectbox("Select a document to summarize:", 
-                                       [doc["filename"] for doc in st.session_state.documents],
+                                       st.session_state.doc_names,
                                        key="summary_select")
             
             if st.button("Generate Summary", key="gen_summary_btn"):
@@ -614,23 +800,29 @@ def main():
         st.markdown("<div class='feature-box'>", unsafe_allow_html=True)
         st.markdown("#### 📄 Chunking Settings")
         
-        chunk_size = st.slider(
-            "Chunk Size",
-            min_value=100,
-            max_value=2000,
-            value=st.session_state.chunk_size,
-            step=100,
-            key="settings_chunk_size"
-        )
-        
-        chunk_overlap = st.slider(
-            "Chunk Overlap",
-            min_value=0,
-            max_value=500,
-            value=st.session_state.chunk_overlap,
-            step=50,
-            key="settings_chunk_overlap"
-        )
+        with st.form("chunking_form"):
+            chunk_size = st.slider(
+                "Chunk Size",
+                min_value=100,
+                max_value=2000,
+                value=st.session_state.chunk_size,
+                step=100,
+                key="settings_chunk_size"
+            )
+            
+            chunk_overlap = st.slider(
+                "Chunk Overlap",
+                min_value=0,
+                max_value=500,
+                value=st.session_state.chunk_overlap,
+                step=50,
+                key="settings_chunk_overlap"
+            )
+            
+            if st.form_submit_button("Save Settings"):
+                # Update chunking config
+                if update_chunking_config(chunk_size, chunk_overlap):
+                    st.success("Settings saved successfully")
         
         st.markdown("</div>", unsafe_allow_html=True)
         
@@ -658,12 +850,6 @@ def main():
             )
         
         st.markdown("</div>", unsafe_allow_html=True)
-        
-        # Save button
-        if st.button("Save Settings", key="save_settings"):
-            # Update chunking config
-            if update_chunking_config(chunk_size, chunk_overlap):
-                st.success("Settings saved successfully")
 
 # Run the app
 if __name__ == "__main__":
@@ -6,41 +6,65 @@ import webbrowser
 import signal
 import atexit
 import argparse
+import urllib.request
+import urllib.error
+import re
+from importlib.metadata import distribution, PackageNotFoundError
 
-def run_backend():
-    """Run the FastAPI backend server"""
+# Dependencies checked before starting the servers
+REQUIREMENTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "requirements.txt")
+
+# Server processes started by this script, stopped together on exit
+server_processes = []
+
+def wait_until_ready(url, timeout=60):
+    """Poll a URL with exponential backoff until the server answers (True) or the timeout passes (False)"""
+    deadline = time.time() + timeout
+    delay = 0.1
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status < 500:
+                    return True
+        except urllib.error.HTTPError as e:
+            if e.code < 500:
+                return True
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+    return False
+
+def run_backend(dev=False):
+    """Run the FastAPI backend server (auto-reloading on code changes in dev mode)"""
     print("🚀 Starting backend server...")
-    backend_process = subprocess.Popen(
-        ["uvicorn", "backend.main:app", "--reload", "--host", "0.0.0.0", "--port", "8002"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-    
-    # Register cleanup function
-    atexit.register(lambda: backend_process.terminate())
+    # A single worker: the vector store and BM25 index live in the server process
+    cmd = ["uvicorn", "backend.main:app", "--host", "0.0.0.0", "--port", "8002"]
+    if dev:
+        cmd.append("--reload")
+    backend_process = subprocess.Popen(cmd)
+    server_processes.append(backend_process)
     
     # Wait for backend to start
-    time.sleep(2)
-    print("✅ Backend server running at http://localhost:8002")
+    if wait_until_ready("http://localhost:8002/status"):
+        print("✅ Backend server running at http://localhost:8002")
+    else:
+        print("⚠️ Backend server did not respond yet at http://localhost:8002")
     return backend_process
 
 def run_frontend():
     """Run the Streamlit frontend"""
     print("🚀 Starting frontend server...")
     frontend_process = subprocess.Popen(
-        ["streamlit", "run", "frontend/app.py"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
+        ["streamlit", "run", "frontend/app.py"]
     )
-    
-    # Register cleanup function
-    atexit.register(lambda: frontend_process.terminate())
+    server_processes.append(frontend_process)
     
     # Wait for frontend to start
-    time.sleep(5)
-    print("✅ Frontend running at http://localhost:8501")
+    if wait_until_ready("http://localhost:8501/_stcore/health"):
+        print("✅ Frontend running at http://localhost:8501")
+    else:
+        print("⚠️ Frontend did not respond yet at http://localhost:8501")
     return frontend_process
 
 def open_browser():
@@ -48,9 +72,23 @@ def open_browser():
     print("🌐 Opening browser...")
     webbrowser.open("http://localhost:8501")
 
+def stop_servers():
+    """Terminate the server processes that are still running and wait for them to exit"""
+    running = [process for process in server_processes if process.poll() is None]
+    for process in running:
+        process.terminate()
+    for process in running:
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    server_processes.clear()
+
 def handle_exit(signum, frame):
     """Handle exit signal"""
     print("\n🛑 Shutting down servers...")
+    stop_servers()
     sys.exit(0)
 
 def create_sample_pdf():
@@ -63,39 +101,53 @@ def create_sample_pdf():
     except Exception as e:
         print(f"❌ Error creating sample PDF: {str(e)}")
 
+def read_requirements(path=REQUIREMENTS_PATH):
+    """Get (distribution name, extras) for each requirement in requirements.txt"""
+    requirements = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            match = re.match(r"([A-Za-z0-9._-]+)\s*(?:\[([^\]]*)\])?", line)
+            if match:
+                extras = [extra.strip() for extra in (match.group(2) or "").split(",") if extra.strip()]
+                requirements.append((match.group(1), extras))
+    return requirements
+
 def check_dependencies():
-    """Check if all required dependencies are installed"""
+    """Check if all required dependencies are installed (from package metadata, without importing them)"""
     print("🔍 Checking dependencies...")
     
-    try:
-        import fastapi
-        import uvicorn
-        import streamlit
-        import langchain
-        import sentence_transformers
-        import faiss
-        import chromadb
-        import pymupdf
-        import pdfplumber
-        import rank_bm25
-        import ollama
-        import dotenv
-        import numpy
-        import pandas
-        import tqdm
-        import fpdf
-        print("✅ All dependencies installed")
-        return True
-    except ImportError as e:
-        print(f"❌ Missing dependency: {str(e)}")
+    missing = []
+    for package, extras in read_requirements():
+        try:
+            dist = distribution(package)
+        except PackageNotFoundError:
+            missing.append(package)
+            continue
+        
+        # Packages pulled in by the requested extras, e.g. h2 for httpx[http2]
+        for requirement in dist.requires or []:
+            extra = re.search(r"extra\s*==\s*[\"']([^\"']+)[\"']", requirement)
+            if extra and extra.group(1) in extras:
+                name = re.match(r"[A-Za-z0-9._-]+", requirement).group(0)
+                try:
+                    distribution(name)
+                except PackageNotFoundError:
+                    missing.append(f"{name} (for {package}[{extra.group(1)}])")
+    
+    if missing:
+        print(f"❌ Missing dependencies: {', '.join(missing)}")
         print("Please install all dependencies with: pip install -r requirements.txt")
         return False
+    print("✅ All dependencies installed")
+    return True
 
 if __name__ == "__main__":
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="Run the PDF Research Assistant")
     parser.add_argument("--no-browser", action="store_true", help="Don't open the browser automatically")
     parser.add_argument("--create-sample", action="store_true", help="Create a sample PDF for testing")
+    parser.add_argument("--dev", action="store_true", help="Reload the backend automatically on code changes")
     args = parser.parse_args()
     
     # Check dependencies
@@ -106,9 +158,10 @@ if __name__ == "__main__":
     if args.create_sample:
         create_sample_pdf()
     
-    # Register signal handlers
+    # Register signal handlers (Ctrl+C included), plus a cleanup for any other exit
     signal.signal(signal.SIGINT, handle_exit)
     signal.signal(signal.SIGTERM, handle_exit)
+    atexit.register(stop_servers)
     
     # Print welcome message
     print("\n" + "=" * 60)
@@ -116,7 +169,7 @@ if __name__ == "__main__":
     print("=" * 60)
     
     # Run backend
-    backend_process = run_backend()
+    backend_process = run_backend(args.dev)
     
     # Run frontend
     frontend_process = run_frontend()
@@ -132,20 +185,16 @@ if __name__ == "__main__":
     print("=" * 60)
     print("\nPress Ctrl+C to exit")
     
-    try:
-        # Monitor processes and restart if needed
-        while True:
-            # Check if backend is still running
-            if backend_process.poll() is not None:
-                print("⚠️ Backend server stopped, restarting...")
-                backend_process = run_backend()
-            
-            # Check if frontend is still running
-            if frontend_process.poll() is not None:
-                print("⚠️ Frontend server stopped, restarting...")
-                frontend_process = run_frontend()
-            
-            time.sleep(2)
-    except KeyboardInterrupt:
-        print("\n🛑 Shutting down servers...")
-        sys.exit(0) 
\ No newline at end of file
+    # Monitor processes and restart if needed
+    while True:
+        # Check if backend is still running
+        if backend_process.poll() is not None:
+            print("⚠️ Backend server stopped, restarting...")
+            backend_process = run_backend(args.dev)
+        
+        # Check if frontend is still running
+        if frontend_process.poll() is not None:
+            print("⚠️ Frontend server stopped, restarting...")
+            frontend_process = run_frontend()
+        
+        time.sleep(2) 
\ No newline at end of file
@@ -1,35 +1,101 @@
 import os
-import sys
+import re
 from fpdf import FPDF
 
-# Add parent directory to path to import config
-current_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(current_dir)
-sys.path.insert(0, parent_dir)
-
-try:
-    from backend import config
-    DATA_DIR = config.DATA_DIR
-except (ImportError, AttributeError):
-    # Fallback to hardcoded values if import fails
-    DATA_DIR = os.path.join(parent_dir, "data")
-    # Create directory if it doesn't exist
-    os.makedirs(DATA_DIR, exist_ok=True)
+# Same location as config.DATA_DIR, without importing the backend package for one path
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# Markdown-style list items: bullet item or ordered item
+LIST_RE = re.compile(
+    r"^[-*] (?P<bullet_text>.*)$"
+    r"|^(?P<ordered>\d{1,3}\. .*)$"
+)
+
+# Bold font size for each heading level (number of leading '#'); other levels are regular text
+HEADING_SIZES = {1: 16, 2: 14, 3: 12}
+
+# Heading prefix ("# ", "## ", ...) -> (prefix length, font size)
+HEADINGS = {"#" * level + " ": (level + 1, size) for level, size in HEADING_SIZES.items()}
+
+class _FileBuffer:
+    """Stand-in for FPDF.buffer that writes appended text straight to a file.
+
+    FPDF only appends to its buffer (buffer += text) and takes its length for
+    the cross-reference offsets, so both are all this needs to support.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.size = 0
+
+    def __iadd__(self, text):
+        data = text.encode("latin-1")
+        self.f.write(data)
+        self.size += len(data)
+        return self
+
+    def __len__(self):
+        return self.size
+
+class _PageBuffer(bytearray):
+    """Page content stream accumulated in place as bytes.
+
+    Implements the two str methods FPDF._putpages calls on a page.
+    """
+
+    def encode(self, *args):
+        return bytes(self)
+
+    def replace(self, old, new, *args):
+        if isinstance(old, str):
+            old = old.encode("latin-1")
+        if isinstance(new, str):
+            new = new.encode("latin-1")
+        return _PageBuffer(bytearray.replace(self, old, new, *args))
+
+class StreamingPDF(FPDF):
+    """FPDF that builds page content in bytearrays and writes the finished document to the output file as it is serialized"""
+
+    def _out(self, s):
+        if self.state != 2:
+            # Unlike FPDF._out, accept bytearray page content (uncompressed documents)
+            super()._out(bytes(s) if isinstance(s, bytearray) else s)
+            return
+        
+        # FPDF appends to the page as a str (page += s), copying the whole page on every call
+        page = self.pages[self.page]
+        if not isinstance(page, _PageBuffer):
+            page = self.pages[self.page] = _PageBuffer(page.encode("latin-1"))
+        if isinstance(s, str):
+            s = s.encode("latin-1")
+        elif not isinstance(s, (bytes, bytearray)):
+            s = str(s).encode("latin-1")
+        page += s
+        page += b"\n"
+
+    def output_file(self, path):
+        """Finish the document and write it to path without building it in memory first"""
+        with open(path, "wb", buffering=1 << 20) as f:
+            self.buffer = _FileBuffer(f)
+            self.close()
 
 def create_sample_pdf():
     """Create a sample PDF from the sample text file"""
-    # Check if sample text file exists
+    # Open the sample text file (read line by line, buffered, below)
     sample_txt = os.path.join(DATA_DIR, "sample.txt")
-    if not os.path.exists(sample_txt):
+    try:
+        f = open(sample_txt, "r", encoding="utf-8", buffering=65536)
+    except FileNotFoundError:
         print(f"Sample text file not found at {sample_txt}")
         return
     
-    # Read the text file
-    with open(sample_txt, "r") as f:
-        text = f.read()
-    
     # Create PDF
-    pdf = FPDF()
+    pdf = StreamingPDF()
+    # Load the metrics of both font styles up front, so later font switches are dict lookups.
+    # No page is open yet, so this writes nothing; the title font goes last because add_page
+    # starts the page with the current font.
+    pdf.set_font("Arial", "", 12)
+    pdf.set_font("Arial", "B", 16)
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
     
@@ -41,38 +107,67 @@ def create_sample_pdf():
     # Add content
     pdf.set_font("Arial", "", 12)
     
-    # Split text into lines and add to PDF
-    lines = text.split("\n")
-    for line in lines:
-        # Handle headings
-        if line.startswith("# "):
-            pdf.set_font("Arial", "B", 16)
-            pdf.cell(0, 10, line[2:], ln=True)
-            pdf.ln(5)
-        elif line.startswith("## "):
-            pdf.set_font("Arial", "B", 14)
-            pdf.cell(0, 10, line[3:], ln=True)
-            pdf.ln(5)
-        elif line.startswith("### "):
-            pdf.set_font("Arial", "B", 12)
-            pdf.cell(0, 10, line[4:], ln=True)
-            pdf.ln(5)
-        # Handle list items
-        elif line.startswith("- ") or line.startswith("* "):
-            pdf.set_font("Arial", "", 12)
-            pdf.cell(0, 10, "  - " + line[2:], ln=True)
-        elif line.startswith("1. ") or line.startswith("2. ") or line.startswith("3. "):
+    # Consecutive list items, and the lines of a paragraph, are each written as one multi_cell once they end
+    pending_items = []
+    pending_lines = []
+    
+    def flush_list():
+        if pending_items:
             pdf.set_font("Arial", "", 12)
-            pdf.cell(0, 10, "  " + line, ln=True)
-        # Regular text
-        elif line.strip():
+            pdf.multi_cell(0, 10, "\n".join(pending_items))
+            pending_items.clear()
+    
+    def flush_paragraph():
+        if pending_lines:
             pdf.set_font("Arial", "", 12)
-            pdf.multi_cell(0, 10, line)
+            pdf.multi_cell(0, 10, "\n".join(pending_lines))
             pdf.ln(2)
+            pending_lines.clear()
+    
+    # Add each line of the text file to the PDF
+    with f:
+        for line in f:
+            # A blank line ends any list or paragraph and needs no other checks
+            if not line.strip():
+                flush_list()
+                flush_paragraph()
+                continue
+            
+            # The core fonts only cover latin-1: replace anything else once here, so
+            # encoding the page content later can't fail partway through the document
+            line = line.rstrip("\n").encode("latin-1", "replace").decode("latin-1")
+            
+            # Handle list items
+            match = LIST_RE.match(line)
+            if match is not None:
+                flush_paragraph()
+                if match.group("bullet_text") is not None:
+                    pending_items.append("  - " + match.group("bullet_text"))
+                else:
+                    pending_items.append("  " + match.group("ordered"))
+                continue
+            flush_list()
+            
+            # Handle headings
+            if line[:1] == "#":
+                level = len(line) - len(line.lstrip("#"))
+                heading = HEADINGS.get(line[:level + 1])
+                if heading is not None:
+                    flush_paragraph()
+                    prefix_len, size = heading
+                    pdf.set_font("Arial", "B", size)
+                    pdf.cell(0, 10, line[prefix_len:], ln=True)
+                    pdf.ln(5)
+                    continue
+            
+            # Regular text
+            pending_lines.append(line)
+        flush_list()
+        flush_paragraph()
     
     # Save the PDF
     output_path = os.path.join(DATA_DIR, "sample.pdf")
-    pdf.output(output_path)
+    pdf.output_file(output_path)
     print(f"Sample PDF created at {output_path}")
 
 if __name__ == "__main__":